@@ -0,0 +1,105 @@
+"""SQLite connection tuning and read replicas.
+
+Every new SQLite connection gets the pragmas of ``settings.SQLITE_PRAGMAS``
+in order, so ``busy_timeout`` should come before ``journal_mode``.
+
+Read-only views decorated with ``read_replica`` read from one of
+``settings.DATABASE_REPLICAS``, picked once per request. ``pin_primary``
+keeps a user on the primary for a short while after a write, so they
+see their own post, comment or follow.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+
+
+# Apps always read from the primary: a session written at login, or a user
+# written at signup or password change, must be found by the very next
+# request.
+PRIMARY_APPS = ('sessions', 'auth')
+
+_state = threading.local()
+
+
+@contextmanager
+def replica_reads():
+    """Route reads of the current thread to one of the replicas."""
+    previous = getattr(_state, 'replica', None)
+    _state.replica = random.choice(settings.DATABASE_REPLICAS)
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def use_primary():
+    """Read from the primary for the rest of ``replica_reads``."""
+    _state.replica = None
+
+
+class ReplicaRouter:
+    """Send reads inside ``replica_reads`` to a replica, the rest to
+    the primary."""
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(_state, 'replica', None)
+        if replica and model._meta.app_label not in PRIMARY_APPS:
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary data.
+        return True
+
+
+def pinned(request):
+    """Whether ``request`` comes shortly after a write of the user."""
+    return settings.REPLICA_PIN_COOKIE in request.COOKIES
+
+
+def read_replica(view):
+    """Serve ``view`` from a replica unless the user is pinned."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.DATABASE_REPLICAS or pinned(request):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def pin_primary(view):
+    """Pin the user to the primary after ``view`` wrote something.
+
+    Write views answer a successful write with a redirect; for
+    ``REPLICA_PIN_SECONDS`` afterwards the user reads their own writes
+    from the primary while replicas catch up.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if settings.DATABASE_REPLICAS and response.status_code in (301, 302):
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+    return wrapper
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# PRAGMA auto_vacuum values.
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class Command(BaseCommand):
+    help = ('Refresh SQLite statistics, return free pages to the file '
+            'system and report table and index sizes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help='Rebuild the file with a full VACUUM, switching it to '
+                 'incremental auto-vacuum. Locks the database meanwhile.',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=None,
+            help='Free at most this many pages by incremental vacuum.',
+        )
+
+    def _pragma(self, cursor, statement):
+        cursor.execute('PRAGMA %s' % statement)
+        return cursor.fetchone()
+
+    def _vacuum(self, cursor, vacuum, pages):
+        auto_vacuum = self._pragma(cursor, 'auto_vacuum')[0]
+        free_pages = self._pragma(cursor, 'freelist_count')[0]
+        if vacuum:
+            if auto_vacuum != AUTO_VACUUM_INCREMENTAL:
+                self._pragma(cursor, 'auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+            self.stdout.write('Database rebuilt by VACUUM.')
+        elif auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+            if pages is None:
+                self._pragma(cursor, 'incremental_vacuum')
+            else:
+                self._pragma(cursor, 'incremental_vacuum(%d)' % pages)
+            self.stdout.write('Incremental vacuum of %d free pages.' % (
+                free_pages - self._pragma(cursor, 'freelist_count')[0]
+            ))
+        else:
+            self.stdout.write(
+                '%d free pages kept: auto-vacuum is off, run with '
+                '--vacuum once to enable it.' % free_pages
+            )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('db_maintenance works with SQLite only.')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            self._pragma(cursor, 'optimize')
+            self.stdout.write('Statistics refreshed.')
+
+            self._vacuum(cursor, options['vacuum'], options['pages'])
+            if self._pragma(cursor, 'journal_mode')[0] == 'wal':
+                self._pragma(cursor, 'wal_checkpoint(TRUNCATE)')
+
+            page_size = self._pragma(cursor, 'page_size')[0]
+            page_count = self._pragma(cursor, 'page_count')[0]
+            try:
+                cursor.execute(
+                    'SELECT dbstat.name, sqlite_master.type, '
+                    'SUM(dbstat.pgsize) FROM dbstat '
+                    'LEFT JOIN sqlite_master '
+                    'ON sqlite_master.name = dbstat.name '
+                    'GROUP BY dbstat.name ORDER BY 3 DESC, 1'
+                )
+                sizes = cursor.fetchall()
+            except connection.Database.OperationalError:
+                sizes = None
+        self.stdout.write('%-40s %-6s %12s' % ('name', 'type', 'KiB'))
+        for name, kind, size in sizes or ():
+            self.stdout.write('%-40s %-6s %12.1f' % (
+                name, kind or '', size / 1024
+            ))
+        if sizes is None:
+            self.stdout.write('Sizes need SQLite built with dbstat.')
+        self.stdout.write(self.style.SUCCESS(
+            'Database size %.1f KiB, %d free pages.' % (
+                page_size * page_count / 1024,
+                self._free_pages(connection),
+            )
+        ))
+
+    def _free_pages(self, connection):
+        with connection.cursor() as cursor:
+            return self._pragma(cursor, 'freelist_count')[0]
@@ -0,0 +1,35 @@
+"""In-process metrics registry.
+
+Each metric keeps the number of observations, their sum and maximum.
+The registry lives in the memory of one worker process; it is meant to
+be scraped or logged, not to be shared between processes.
+"""
+import logging
+import threading
+
+logger = logging.getLogger('yatube.metrics')
+
+_lock = threading.Lock()
+_metrics = {}
+
+
+def observe(name, value):
+    """Record one ``value`` of the metric ``name``."""
+    with _lock:
+        count, total, maximum = _metrics.get(name, (0, 0, value))
+        _metrics[name] = (count + 1, total + value, max(maximum, value))
+    logger.debug('%s=%s', name, value)
+
+
+def snapshot():
+    """Return ``{name: {'count', 'sum', 'max'}}`` for every metric."""
+    with _lock:
+        return {
+            name: {'count': count, 'sum': total, 'max': maximum}
+            for name, (count, total, maximum) in _metrics.items()
+        }
+
+
+def reset():
+    with _lock:
+        _metrics.clear()
@@ -0,0 +1,143 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import querylog, timing
+
+logger = logging.getLogger('yatube.query_budget')
+timing_logger = logging.getLogger('yatube.timing')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudgetMiddleware:
+    """Complain when a view issues more SQL queries than allowed.
+
+    Only the read views named in ``settings.QUERY_BUDGET_VIEWS`` are
+    checked against ``settings.QUERY_BUDGET``. Queries issued by other
+    middleware during the same request are counted too. Meant for
+    development: raises ``QueryBudgetExceeded`` when
+    ``settings.QUERY_BUDGET_RAISE`` is set and logs a warning otherwise.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.QUERY_BUDGET is None:
+            return self.get_response(request)
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        view_name = getattr(request, 'query_budget_view', None)
+        if view_name and len(queries) > settings.QUERY_BUDGET:
+            message = '%s issued %d SQL queries, the budget is %d' % (
+                view_name, len(queries), settings.QUERY_BUDGET,
+            )
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={'queries': queries})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = '%s.%s' % (view_func.__module__, view_func.__name__)
+        if view_name in settings.QUERY_BUDGET_VIEWS:
+            request.query_budget_view = view_name
+
+
+class ServerTimingMiddleware:
+    """Report where the time of every request went.
+
+    SQL time and query count of all connections, template rendering,
+    the view and the whole request are sent as a ``Server-Timing``
+    header when ``settings.SERVER_TIMING`` is set or to staff users,
+    and always logged to ``yatube.timing`` with the view name. Template
+    time is only measured for requests getting the header. Anything
+    measured with ``core.timing.measure`` during the request, e.g.
+    thumbnail lookups, is reported too. Should come first in
+    ``MIDDLEWARE`` so ``total`` includes the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    @staticmethod
+    def _send_header(request):
+        user = getattr(request, 'user', None)
+        return settings.SERVER_TIMING or (user is not None and user.is_staff)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with timing.collect() as timings, ExitStack() as stack:
+            request.server_timings = timings
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(timings.execute_wrapper)
+                )
+            response = self.get_response(request)
+            finished = time.perf_counter()
+        view_started = getattr(request, 'server_timing_view_started', None)
+        if view_started is not None:
+            timings.add('view', finished - view_started)
+        timings.add('total', finished - started)
+        durations = {
+            name: round(seconds * 1000, 2)
+            for name, seconds in timings.durations.items()
+        }
+        durations.setdefault('sql', 0.0)
+        queries = timings.counts.get('sql', 0)
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        if self._send_header(request):
+            response['Server-Timing'] = ', '.join(
+                '%s;dur=%s%s' % (
+                    name, duration,
+                    ';desc="%d queries"' % queries if name == 'sql' else '',
+                )
+                for name, duration in sorted(durations.items())
+            )
+        timing_logger.info(
+            '%s %s %s %d %s', request.method, request.path, view_name,
+            response.status_code, ' '.join(
+                '%s=%sms' % item for item in sorted(durations.items())
+            ),
+            extra={
+                'view_name': view_name,
+                'status': response.status_code,
+                'queries': queries,
+                'timings': durations,
+            },
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.server_timings.templates = self._send_header(request)
+        request.server_timing_view_started = time.perf_counter()
+
+
+class QueryLogMiddleware:
+    """Attribute the queries of a request to its view in ``querylog``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            querylog.set_view(None)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        querylog.set_view(request.resolver_match.view_name)
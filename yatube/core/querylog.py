@@ -0,0 +1,158 @@
+"""Aggregated SQL statistics by query fingerprint.
+
+Every statement run on a database connection is normalized into a
+fingerprint: literals and parameters become ``?`` and ``IN`` lists
+collapse, so ``WHERE id IN (1, 2)`` and ``WHERE id IN (3)`` count as one
+query. Count, total and maximum time are kept per fingerprint and per
+view serving the request, like ``core.metrics`` in the memory of one
+worker process. Statements slower than ``settings.SLOW_QUERY_MS`` are
+logged to ``yatube.slow_query``. Their query plans are not read on the
+request path: the first slow execution of a fingerprint is kept and
+explained by ``explain_pending`` when the staff report is rendered.
+"""
+import functools
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('yatube.slow_query')
+
+# Label of queries issued outside a view, e.g. by commands or workers.
+NO_VIEW = '-'
+
+_NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+_lock = threading.Lock()
+_stats = {}
+_state = threading.local()
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """``sql`` with literals and parameters replaced by ``?``."""
+    for pattern, replacement in _NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def set_view(view_name):
+    """Attribute the queries of this thread to ``view_name``."""
+    _state.view = view_name
+
+
+def _plan(connection, sql, params):
+    """Query plan of a ``SELECT``, read past the execute wrappers."""
+    if (sql.lstrip()[:6].upper() != 'SELECT'
+            or not connection.features.supports_explaining_query_execution):
+        return None
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(
+            '%s %s' % (connection.ops.explain_query_prefix(), sql), params
+        )
+        return '\n'.join(
+            ' '.join(str(column) for column in row)
+            for row in cursor.fetchall()
+        )
+    finally:
+        cursor.close()
+
+
+def record(connection, sql, params, many, seconds):
+    """Add one execution of ``sql`` to the statistics."""
+    key = (fingerprint(sql), getattr(_state, 'view', None) or NO_VIEW)
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            if len(_stats) >= settings.QUERY_LOG_MAX_ENTRIES:
+                return
+            entry = _stats[key] = {
+                'count': 0, 'total': 0.0, 'max': 0.0, 'plan': None,
+                'sample': None,
+            }
+        entry['count'] += 1
+        entry['total'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+        if seconds * 1000 < settings.SLOW_QUERY_MS:
+            return
+        if entry['plan'] is None and entry['sample'] is None and not many:
+            entry['sample'] = (connection.alias, sql, tuple(params or ()))
+    logger.warning(
+        'Slow query in %s: %.1f ms %s', key[1], seconds * 1000, sql,
+        extra={'fingerprint': key[0], 'view_name': key[1]},
+    )
+
+
+def explain_pending():
+    """Read the plans of slow queries not explained yet."""
+    with _lock:
+        pending = [
+            entry for entry in _stats.values()
+            if entry['plan'] is None and entry['sample'] is not None
+        ]
+    for entry in pending:
+        alias, sql, params = entry['sample']
+        connection = connections[alias]
+        plan = None
+        try:
+            connection.ensure_connection()
+            plan = _plan(connection, sql, params)
+        except Exception:
+            logger.exception('Can not explain %s', fingerprint(sql))
+        with _lock:
+            entry['plan'] = plan or ''
+            entry['sample'] = None
+
+
+def snapshot():
+    """Statistics in milliseconds, the most total time first."""
+    with _lock:
+        rows = [
+            {
+                'fingerprint': query,
+                'view': view,
+                'count': entry['count'],
+                'total_ms': entry['total'] * 1000,
+                'avg_ms': entry['total'] * 1000 / entry['count'],
+                'max_ms': entry['max'] * 1000,
+                'plan': entry['plan'],
+            }
+            for (query, view), entry in _stats.items()
+        ]
+    return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+@receiver(connection_created)
+def install(sender, connection, **kwargs):
+    """Record every statement run on ``connection``."""
+    if not settings.QUERY_LOG:
+        return
+
+    def execute_wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            record(
+                connection, sql, params, many,
+                time.perf_counter() - started,
+            )
+
+    connection.execute_wrappers.append(execute_wrapper)
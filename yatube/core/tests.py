@@ -1,6 +1,23 @@
-from django.test import TestCase
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, router
+from django.http import HttpResponse, HttpResponseRedirect
+from django.template.base import Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
 from http import HTTPStatus
 
+from core import querylog, timing
+from core.db import pin_primary, read_replica, replica_reads
+from posts.models import Post
+
+User = get_user_model()
+
 
 class ViewTestClass(TestCase):
     def setUp(self):
@@ -11,3 +28,201 @@ class ViewTestClass(TestCase):
         response = self.client.get('/this_page_does_not_exist/')
         self.assertEqual(response.status_code, self.response_404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class DatabaseTests(TestCase):
+    def test_sqlite_pragmas_applied(self):
+        """Соединение с SQLite получает настройки из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+            cursor.execute('PRAGMA cache_size')
+            cache_size = cursor.fetchone()[0]
+        self.assertEqual(busy_timeout, settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(cache_size, settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_db_maintenance(self):
+        """Команда обслуживания обновляет статистику и выводит размеры."""
+        out = StringIO()
+        call_command('db_maintenance', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Statistics refreshed.', output)
+        self.assertIn('Database size', output)
+
+
+@read_replica
+def reading_view(request):
+    return HttpResponse(' '.join(
+        router.db_for_read(model) for model in (Post, User, Session)
+    ))
+
+
+@pin_primary
+def writing_view(request):
+    return HttpResponseRedirect('/')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_reads_routed_to_replica(self):
+        """Чтение идет с реплики, пользователи и сессии всегда с основной
+        базы."""
+        response = reading_view(self.factory.get('/'))
+        self.assertEqual(response.content, b'replica default default')
+
+    def test_pinned_reads_routed_to_primary(self):
+        """После записи чтение идет с основной базы."""
+        request = self.factory.get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+        self.assertEqual(
+            reading_view(request).content, b'default default default'
+        )
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """Без реплик все читается с основной базы."""
+        response = reading_view(self.factory.get('/'))
+        self.assertEqual(response.content, b'default default default')
+
+    def test_write_pins_user(self):
+        response = writing_view(self.factory.post('/'))
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_users_read_from_primary(self):
+        """Пользователь, созданный при регистрации, читается с основной
+        базы уже в следующем запросе."""
+        with replica_reads():
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_read(Post), 'replica')
+
+    def test_router_outside_views(self):
+        self.assertIsNone(router.routers[0].db_for_read(User))
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        """Ответ содержит время SQL, шаблонов, view и всего запроса."""
+        response = self.client.get('/')
+        header = response['Server-Timing']
+        for name in ('sql;dur=', 'template;dur=', 'view;dur=',
+                     'total;dur='):
+            with self.subTest(name=name):
+                self.assertIn(name, header)
+        self.assertRegex(header, r'sql;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_timings_logged_with_view_name(self):
+        """Время запроса пишется в лог вместе с именем view."""
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            self.client.get('/')
+        record = logs.records[0]
+        self.assertEqual(record.view_name, 'posts:index')
+        self.assertEqual(record.status, HTTPStatus.OK)
+        self.assertGreater(record.timings['total'], 0)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_disabled(self):
+        with self.assertLogs('yatube.timing', 'INFO'):
+            response = self.client.get('/')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_templates_timed_only_with_header(self):
+        """Время шаблонов замеряется только для запросов с заголовком,
+        без подмены Template.render."""
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            self.client.get('/')
+        self.assertNotIn('template', logs.records[0].timings)
+        self.assertEqual(Template.render.__module__, 'django.template.base')
+
+    @override_settings(SERVER_TIMING=False)
+    def test_header_sent_to_staff(self):
+        """Сотрудники получают заголовок и без SERVER_TIMING."""
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertIn('template;dur=', self.client.get('/')['Server-Timing'])
+
+    def test_measure_reaches_every_collection(self):
+        """Замер попадает во все открытые сборы, в том числе вложенные."""
+        with timing.collect() as outer, timing.collect() as inner:
+            with timing.measure('template'):
+                pass
+        self.assertEqual(outer.counts, {'template': 1})
+        self.assertEqual(inner.counts, {'template': 1})
+
+    def test_nested_measures_counted_once(self):
+        """Вложенные замеры одного имени не суммируются дважды."""
+        with timing.collect() as timings:
+            with timing.measure('template'):
+                with timing.measure('template'):
+                    pass
+        self.assertEqual(timings.counts, {'template': 1})
+
+    def test_measure_outside_request(self):
+        with timing.measure('template'):
+            pass
+        self.assertIsNone(timing.current())
+
+
+class QueryLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        querylog.reset()
+
+    def test_fingerprint_strips_literals(self):
+        """Отпечаток запроса не зависит от литералов и длины IN."""
+        self.assertEqual(
+            querylog.fingerprint(
+                "SELECT \"id\" FROM \"t1\" WHERE \"id\" IN (%s, %s) "
+                "AND \"name\" = 'it''s' LIMIT 10"
+            ),
+            'SELECT "id" FROM "t1" WHERE "id" IN (...) '
+            'AND "name" = ? LIMIT ?',
+        )
+
+    def test_queries_aggregated_by_view(self):
+        """Запросы суммируются по отпечатку и view."""
+        for _ in range(2):
+            cache.clear()
+            self.client.get('/')
+        queries = [
+            query for query in querylog.snapshot()
+            if query['view'] == 'posts:index'
+        ]
+        self.assertTrue(queries)
+        self.assertTrue(all(query['count'] == 2 for query in queries))
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_explained_off_request_path(self):
+        """Медленный запрос попадает в лог, а план читается позже, для
+        отчета."""
+        with self.assertLogs('yatube.slow_query', 'WARNING') as logs:
+            User.objects.filter(username='slow').exists()
+        query = logs.records[0].fingerprint
+        plans = {row['fingerprint']: row['plan']
+                 for row in querylog.snapshot()}
+        self.assertIsNone(plans[query])
+        querylog.explain_pending()
+        plans = {row['fingerprint']: row['plan']
+                 for row in querylog.snapshot()}
+        self.assertRegex(plans[query], 'SEARCH|SCAN')
+
+    def test_report_staff_only(self):
+        """Отчет о запросах доступен только персоналу."""
+        url = reverse('core:query_report')
+        user = User.objects.create_user(username='reader')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        user.is_staff = True
+        user.save()
+        self.client.get('/')
+        response = self.client.get(url, {'view': 'posts:index'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'posts_post')
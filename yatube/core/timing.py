@@ -0,0 +1,113 @@
+"""Timings of the current request for ``ServerTimingMiddleware``.
+
+Code running in a request adds its duration with ``measure(name)``.
+Outside a request, e.g. in the thumbnail workers, measuring does
+nothing. Nested measures of the same name are counted once, so an
+included template is part of the template that includes it.
+
+Measures go to every collection open on the thread, so the view
+benchmarks can collect around requests the middleware collects too.
+Templates rendered by the ``TimedDjangoTemplates`` backend are measured
+as ``template`` only while a collection asking for them is open.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.template.backends.django import DjangoTemplates, Template
+
+_state = threading.local()
+
+
+def _collections():
+    if not hasattr(_state, 'collections'):
+        _state.collections = []
+    return _state.collections
+
+
+class Timings:
+    def __init__(self, templates=False):
+        self.templates = templates
+        self.durations = {}
+        self.counts = {}
+        self.active = set()
+
+    def add(self, name, seconds, count=1):
+        self.durations[name] = self.durations.get(name, 0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """``connection.execute_wrapper`` recording SQL time and count."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('sql', time.perf_counter() - started)
+
+
+def current():
+    """Innermost ``Timings`` collected by this thread, if any."""
+    collections = _collections()
+    return collections[-1] if collections else None
+
+
+@contextmanager
+def collect(templates=False):
+    """Collect the timings of the code run in the block, with template
+    renders when ``templates`` is set."""
+    timings = Timings(templates)
+    _collections().append(timings)
+    try:
+        yield timings
+    finally:
+        _collections().remove(timings)
+
+
+@contextmanager
+def measure(name):
+    """Add the duration of the block to ``name`` of open collections."""
+    collections = [
+        timings for timings in _collections() if name not in timings.active
+    ]
+    if not collections:
+        yield
+        return
+    for timings in collections:
+        timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        for timings in collections:
+            timings.active.discard(name)
+            timings.add(name, seconds)
+
+
+def templates_timed():
+    """Whether an open collection measures template renders."""
+    return any(timings.templates for timings in _collections())
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        if not templates_timed():
+            return super().render(context, request)
+        with measure('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django templates backend measuring renders as ``template``.
+
+    Only the templates a view renders pass through the backend; those
+    they include are part of their render.
+    """
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return TimedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
 
+from . import querylog
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +19,19 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def query_report(request):
+    """Hot SQL queries of this worker by fingerprint and view."""
+    querylog.explain_pending()
+    queries = querylog.snapshot()
+    view = request.GET.get('view')
+    if view:
+        queries = [query for query in queries if query['view'] == view]
+    context = {
+        'queries': queries,
+        'view': view,
+        'slow_query_ms': settings.SLOW_QUERY_MS,
+    }
+    return render(request, 'core/queries.html', context)
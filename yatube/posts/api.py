@@ -0,0 +1,116 @@
+"""Read-only JSON API of the feeds and posts.
+
+Rows are serialized straight from ``values()`` querysets, without model
+instances, and paginated by the same cursors as the HTML feeds. With
+``?format=ndjson`` a feed is streamed page by page as newline-delimited
+JSON from the requested cursor to its end, so memory use does not
+depend on the size of the result.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from .feeds import FollowFeed
+from .models import Group, Post
+from .paginator import CursorPaginator, InvalidCursor
+
+User = get_user_model()
+
+POST_FIELDS = (
+    'pk', 'text', 'pub_date', 'author__username', 'group__slug', 'image',
+    'comment_count',
+)
+
+
+def serialize_post(row):
+    return {
+        'id': row['pk'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'author': row['author__username'],
+        'group': row['group__slug'],
+        'image': default_storage.url(row['image']) if row['image'] else None,
+        'comment_count': row['comment_count'],
+    }
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('limit', settings.PAGE_PER_PAGE))
+    except ValueError:
+        size = settings.PAGE_PER_PAGE
+    return max(1, min(size, settings.API_MAX_PAGE_SIZE))
+
+
+def _stream(paginator, after):
+    while True:
+        page = paginator.page(after=after)
+        for row in page:
+            yield json.dumps(serialize_post(row), cls=DjangoJSONEncoder)
+            yield '\n'
+        if not page.has_next():
+            return
+        after = page.next_cursor
+
+
+def feed_response(request, rows):
+    """Respond with a page of ``rows`` or stream all of them as NDJSON."""
+    rows = rows.values(*POST_FIELDS)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if request.GET.get('format') == 'ndjson':
+        paginator = CursorPaginator(rows, settings.API_STREAM_CHUNK_SIZE)
+        try:
+            if after:
+                paginator.decode_cursor(after)
+        except InvalidCursor:
+            return JsonResponse({'detail': 'Invalid cursor.'}, status=400)
+        return StreamingHttpResponse(
+            _stream(paginator, after),
+            content_type='application/x-ndjson',
+        )
+    paginator = CursorPaginator(rows, _page_size(request))
+    try:
+        page = paginator.page(after=after, before=before)
+    except InvalidCursor:
+        return JsonResponse({'detail': 'Invalid cursor.'}, status=400)
+    return JsonResponse({
+        'results': [serialize_post(row) for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, Post.objects.filter(group=group))
+
+
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed_response(request, Post.objects.filter(author=author))
+
+
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'},
+            status=401,
+        )
+    return feed_response(request, FollowFeed(request.user))
+
+
+def post_detail(request, post_id):
+    row = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+    if row is None:
+        raise Http404('No post matches the given query.')
+    return JsonResponse(serialize_post(row))
@@ -0,0 +1,247 @@
+"""View benchmarks: latency, SQL queries and template render time.
+
+Every feed view is requested through the test client on data generated
+by ``seed_yatube`` at several scales. Results are keyed ``view@scale``
+and compared with a JSON baseline recorded on the same machine.
+``card_costs`` compares the render cost of one feed card as the baseline
+template included per post and as the ``post_card`` tag.
+"""
+import math
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.template import Context, Engine, engines
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import timing
+
+from . import thumbnails
+from .models import Group, Post, UserCounters
+
+# Timings checked against the baseline; p99 of a few dozen requests is
+# close to their maximum and too noisy to fail a run on.
+GATED_METRICS = ('p50_ms', 'p90_ms', 'render_ms')
+
+# Differences below this are noise whatever the tolerance.
+NOISE_MS = 2.0
+
+
+# Name of the feed card the baseline card is included as.
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+
+# Loaders of the configured engine before the cached loader wraps them.
+SOURCE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of non-empty ``values``."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def seed_options(scale, seed=0):
+    """``seed_yatube`` options generating ``scale`` posts."""
+    return {
+        'seed': seed,
+        'users': max(10, scale // 10),
+        'groups': max(3, scale // 200),
+        'posts': scale,
+        'comments': scale * 2,
+        'follows': scale,
+    }
+
+
+def targets():
+    """Yield ``(view, url, user)`` for the busiest objects of each view."""
+    yield 'index', reverse('posts:index'), None
+    group = Group.objects.annotate(
+        total=Count('posts')
+    ).order_by('-total', 'pk').first()
+    if group is not None:
+        yield 'group_posts', reverse(
+            'posts:group_posts', args=[group.slug]
+        ), None
+    author = UserCounters.objects.select_related('user').order_by(
+        '-posts_count', 'pk'
+    ).first()
+    if author is not None:
+        yield 'profile', reverse(
+            'posts:profile', args=[author.user.username]
+        ), None
+    post = Post.objects.order_by('-comment_count', 'pk').first()
+    if post is not None:
+        yield 'post_detail', reverse(
+            'posts:post_detail', args=[post.pk]
+        ), None
+    reader = UserCounters.objects.select_related('user').order_by(
+        '-following_count', 'pk'
+    ).first()
+    if reader is not None:
+        yield 'follow_index', reverse('posts:follow_index'), reader.user
+
+
+def measure(url, user=None, repeat=20, warm=False):
+    """Request ``url`` ``repeat`` times and summarize the timings.
+
+    The cache is cleared before every request unless ``warm`` is set.
+    A first request, left out of the results, loads code and templates.
+    """
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    client.get(url)
+    walls, renders, queries = [], [], []
+    for _ in range(repeat):
+        if not warm:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured, \
+                timing.collect(templates=True) as timings:
+            started = time.perf_counter()
+            response = client.get(url)
+            walls.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise BenchmarkError('%s responded with %d' % (
+                url, response.status_code
+            ))
+        renders.append(timings.durations.get('template', 0))
+        queries.append(len(captured))
+    return {
+        'p50_ms': round(percentile(walls, 0.5) * 1000, 2),
+        'p90_ms': round(percentile(walls, 0.9) * 1000, 2),
+        'p99_ms': round(percentile(walls, 0.99) * 1000, 2),
+        'render_ms': round(percentile(renders, 0.5) * 1000, 2),
+        'queries': max(queries),
+    }
+
+
+def run(scales, repeat=20, warm=False, seed=0):
+    """Benchmark every view at every scale on a flushed database."""
+    results = {}
+    for scale in scales:
+        call_command('flush', interactive=False, verbosity=0)
+        call_command(
+            'seed_yatube', stdout=StringIO(), **seed_options(scale, seed)
+        )
+        for view, url, user in targets():
+            results['%s@%d' % (view, scale)] = measure(
+                url, user, repeat=repeat, warm=warm
+            )
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return descriptions of results worse than ``baseline``.
+
+    Timings may exceed the baseline by ``tolerance`` (a fraction), query
+    counts may not grow at all.
+    """
+    regressions = []
+    for key, current in sorted(results.items()):
+        expected = baseline.get(key)
+        if expected is None:
+            continue
+        for metric in GATED_METRICS:
+            limit = max(
+                expected[metric] * (1 + tolerance),
+                expected[metric] + NOISE_MS,
+            )
+            if current[metric] > limit:
+                regressions.append('%s %s: %.2f > %.2f' % (
+                    key, metric, current[metric], limit
+                ))
+        if current['queries'] > expected['queries']:
+            regressions.append('%s queries: %d > %d' % (
+                key, current['queries'], expected['queries']
+            ))
+    return regressions
+
+
+def _render_cost(template, context, cards, repeat):
+    template.render(Context(context))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        template.render(Context(context))
+    return round((time.perf_counter() - started) / repeat / cards * 1e6, 1)
+
+
+def baseline_card(path=None):
+    """Source of the feed card at ``path``.
+
+    By default ``BENCHMARK_CARD_BASELINE``, the card included per post
+    before ``post_card`` was added.
+    """
+    try:
+        with open(path or settings.BENCHMARK_CARD_BASELINE,
+                  encoding='utf-8') as card:
+            return card.read()
+    except OSError as error:
+        raise BenchmarkError('Can not read the baseline card: %s' % error)
+
+
+def _engine(cached, templates=None):
+    """The configured engine, with or without the cached loader.
+
+    ``templates`` override files of the same name.
+    """
+    engine = engines['django'].engine
+    loaders = list(SOURCE_LOADERS)
+    if templates:
+        loaders.insert(0, ('django.template.loaders.locmem.Loader', templates))
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    return Engine(
+        dirs=engine.dirs,
+        loaders=loaders,
+        libraries=engine.libraries,
+        debug=engine.debug,
+    )
+
+
+def card_costs(posts, user=None, baseline=None, repeat=100):
+    """Render cost of one card of ``posts`` in microseconds.
+
+    The ``baseline`` card source (by default ``baseline_card()``) is
+    included per post and the current one rendered by ``post_card``,
+    each from the same engine without (``*_us``) and with
+    (``*_cached_us``) the cached loader. Comparing the pairs separates
+    the loader from the tag.
+    """
+    posts = list(posts)
+    if not posts:
+        raise BenchmarkError('No posts to render, run seed_yatube first.')
+    if baseline is None:
+        baseline = baseline_card()
+    thumbnails.prefetch(posts)
+    context = {'posts': posts, 'user': user}
+    costs = {}
+    for suffix, cached in (('_us', False), ('_cached_us', True)):
+        included = _engine(cached, {CARD_TEMPLATE: baseline}).from_string(
+            '{%% for post in posts %%}{%% include "%s" %%}{%% endfor %%}'
+            % CARD_TEMPLATE
+        )
+        tagged = _engine(cached).from_string(
+            '{% load post_cards %}{% for post in posts %}'
+            '{% post_card post %}'
+            '{% if not forloop.last %}<hr>{% endif %}{% endfor %}'
+        )
+        costs['include' + suffix] = _render_cost(
+            included, context, len(posts), repeat
+        )
+        costs['post_card' + suffix] = _render_cost(
+            tagged, context, len(posts), repeat
+        )
+    return costs
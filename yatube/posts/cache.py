@@ -0,0 +1,140 @@
+"""Versioned cache keys for feed and post pages.
+
+Every cached fragment varies on the versions of the scopes it renders,
+e.g. ``index`` or ``group:<id>``. Signal handlers bump the versions of
+the scopes a write touches, so a new fragment is rendered on the next
+request while the stale one simply expires. This keeps read-your-writes
+with timeouts of hours.
+
+Versions are bumped when a write happens and again once it commits:
+a page a concurrent request renders from the state before the commit
+is cached under the first new version, which the second one retires.
+
+Versions start at the current time in milliseconds, so a version key
+evicted from the cache never comes back with a number already used.
+
+With read replicas a replica may not have a write yet when the version
+is bumped. Pages built from a scope bumped in the last
+``REPLICA_PIN_SECONDS`` are therefore read from the primary, otherwise
+a stale page could be cached under the new version.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core import db
+
+INDEX = 'index'
+
+VERSION_KEY = 'posts:cache-version:%s'
+
+PAGE_KEY = 'posts:page:%s:%s'
+
+BUMPED_KEY = 'posts:cache-bumped:%s'
+
+
+def group_scope(group_id):
+    return 'group:%s' % group_id
+
+
+def profile_scope(author_id):
+    return 'profile:%s' % author_id
+
+
+def follow_scope(user_id):
+    return 'follow:%s' % user_id
+
+
+def post_scope(post_id):
+    return 'post:%s' % post_id
+
+
+def _initial_version():
+    return int(time.time() * 1000)
+
+
+def versions(*scopes):
+    """Return one string combining the current versions of ``scopes``."""
+    keys = [VERSION_KEY % scope for scope in scopes]
+    bumped = []
+    if settings.DATABASE_REPLICAS:
+        bumped = [BUMPED_KEY % scope for scope in scopes]
+    found = cache.get_many(keys + bumped)
+    if any(key in found for key in bumped):
+        db.use_primary()
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, _initial_version(), None)
+        found.update(cache.get_many(missing))
+    return '.'.join(str(found.get(key, 0)) for key in keys)
+
+
+def bump(*scopes):
+    """Invalidate everything cached under ``scopes``, now and once the
+    current transaction commits."""
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = VERSION_KEY % scope
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), None)
+    if settings.DATABASE_REPLICAS:
+        cache.set_many(
+            {BUMPED_KEY % scope: True for scope in scopes},
+            settings.REPLICA_PIN_SECONDS,
+        )
+
+
+def fragment_context(*scopes):
+    """Template context for ``{% cache %}`` of a page built from ``scopes``."""
+    return {
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'cache_version': versions(*scopes),
+    }
+
+
+def etag(request, *scopes):
+    """Validator of a page built from ``scopes`` for the requesting user."""
+    return '%s-%s' % (versions(*scopes), request.user.pk or 0)
+
+
+def anonymous_page(scopes):
+    """Cache whole responses of a view for anonymous ``GET`` requests.
+
+    ``scopes(request, *args, **kwargs)`` names the scopes the page is
+    built from; their versions and the full path key the response, so
+    bumping any of them invalidates it. Authenticated requests and
+    responses that are not plain 200 pages always go to the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            key = PAGE_KEY % (
+                versions(*scopes(request, *args, **kwargs)),
+                hashlib.md5(request.get_full_path().encode()).hexdigest(),
+            )
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if (response.status_code == 200 and not response.streaming
+                        and not response.cookies):
+                    cache.set(
+                        key, response, settings.ANONYMOUS_PAGE_CACHE_TIMEOUT
+                    )
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,127 @@
+"""Denormalized counters of posts, comments and follows.
+
+``Post.comment_count`` and ``UserCounters`` are moved by signal handlers
+with ``F()`` expressions, so they share the transaction of the write
+that changed them. ``UserCounters`` rows are created together with
+their user, so a delta never meets a missing row. ``reconcile``
+recomputes everything in batches, creates rows of users inserted with
+``bulk_create`` and repairs drift left by writes that bypass signals
+(``QuerySet.update``, raw SQL).
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, UserCounters
+
+User = get_user_model()
+
+# UserCounters field -> (model, lookup pointing at the user).
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _recount(user_id):
+    return {
+        field: model.objects.filter(**{lookup: user_id}).count()
+        for field, (model, lookup) in USER_COUNTERS.items()
+    }
+
+
+def for_user(user_id):
+    """Return ``UserCounters`` of ``user_id``.
+
+    Never writes, as it is called from views reading a replica. A user
+    without a row yet, e.g. one imported with ``bulk_create``, gets
+    unsaved counters counted from the source tables.
+    """
+    if user_id is None:
+        return UserCounters()
+    try:
+        return UserCounters.objects.get(user_id=user_id)
+    except UserCounters.DoesNotExist:
+        return UserCounters(user_id=user_id, **_recount(user_id))
+
+
+def create_for(user_id):
+    """Create zeroed counters of the new user ``user_id``."""
+    UserCounters.objects.get_or_create(user_id=user_id)
+
+
+def add(user_id, field, delta):
+    """Move ``field`` of ``user_id`` counters by ``delta``."""
+    if user_id is None:
+        return
+    # Without a row (a user being deleted or not reconciled yet) there
+    # is nothing to move: for_user() counts such users from scratch.
+    UserCounters.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta}
+    )
+
+
+def add_comments(post_id, delta):
+    if post_id is None:
+        return
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta
+    )
+
+
+def _count_of(model, lookup):
+    rows = model.objects.filter(**{lookup: OuterRef('pk')}).order_by(
+    ).values(lookup).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _batches(queryset, batch_size):
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[
+            :batch_size
+        ])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def reconcile(batch_size=1000):
+    """Recompute all counters, return the number of rows repaired."""
+    repaired = 0
+    posts = Post.objects.annotate(
+        actual=_count_of(Comment, 'post')
+    ).only('pk', 'comment_count')
+    for batch in _batches(posts, batch_size):
+        stale = [post for post in batch if post.comment_count != post.actual]
+        for post in stale:
+            post.comment_count = post.actual
+        with transaction.atomic():
+            Post.objects.bulk_update(stale, ['comment_count'])
+        repaired += len(stale)
+
+    users = User.objects.annotate(**{
+        field: _count_of(model, lookup)
+        for field, (model, lookup) in USER_COUNTERS.items()
+    }).only('pk')
+    for batch in _batches(users, batch_size):
+        existing = UserCounters.objects.in_bulk([user.pk for user in batch])
+        stale, missing = [], []
+        for user in batch:
+            actual = {field: getattr(user, field) for field in USER_COUNTERS}
+            counters = existing.get(user.pk)
+            if counters is None:
+                missing.append(UserCounters(user_id=user.pk, **actual))
+            elif any(getattr(counters, field) != value
+                     for field, value in actual.items()):
+                for field, value in actual.items():
+                    setattr(counters, field, value)
+                stale.append(counters)
+        with transaction.atomic():
+            UserCounters.objects.bulk_update(stale, list(USER_COUNTERS))
+            UserCounters.objects.bulk_create(missing, ignore_conflicts=True)
+        repaired += len(stale) + len(missing)
+    return repaired
@@ -0,0 +1,175 @@
+"""Hybrid push/pull follow feed.
+
+Posts of ordinary authors are read from the materialized timeline of
+the user, posts of the celebrity authors they follow (see
+``timeline.celebrity_ids``) are pulled from ``Post`` at read time with
+one query. Both sources are already sorted, so the page is a merge that
+reads at most one page per source.
+"""
+import heapq
+import time
+
+from django.conf import settings
+from django.db.models import Q
+
+from core import metrics
+
+from .models import Post, TimelineEntry
+from .paginator import FEED_ORDERING
+from .timeline import celebrity_ids
+
+# How ``Post`` lookups map onto ``TimelineEntry`` columns.
+TIMELINE_FIELDS = {'pub_date': 'pub_date', 'pk': 'post_id'}
+
+
+def _translate(condition, names):
+    """Rewrite the lookups of ``condition`` through ``names``."""
+    translated = Q()
+    translated.connector = condition.connector
+    translated.negated = condition.negated
+    for child in condition.children:
+        if isinstance(child, Q):
+            translated.children.append(_translate(child, names))
+            continue
+        lookup, value = child
+        name, sep, rest = lookup.partition('__')
+        translated.children.append((names[name] + sep + rest, value))
+    return translated
+
+
+class _Source:
+    """Sorted stream of posts backed by one queryset."""
+
+    def __init__(self, queryset, names=None):
+        self.queryset = queryset
+        self.names = names
+
+    def filter(self, condition):
+        if self.names:
+            condition = _translate(condition, self.names)
+        return _Source(self.queryset.filter(condition), self.names)
+
+    def order_by(self, *ordering):
+        if self.names:
+            ordering = [
+                ('-' if name.startswith('-') else '')
+                + self.names[name.lstrip('-')]
+                for name in ordering
+            ]
+        return _Source(self.queryset.order_by(*ordering), self.names)
+
+    def head(self, limit, fields=None):
+        """First ``limit`` posts of the stream, or their ``fields``."""
+        if fields and self.names:
+            rows = self.queryset.values(
+                *('post__' + field for field in fields)
+            )[:limit]
+            return [
+                {field: row['post__' + field] for field in fields}
+                for row in rows
+            ]
+        if fields:
+            return list(self.queryset.values(*fields)[:limit])
+        rows = self.queryset[:limit]
+        if self.names:
+            return [entry.post for entry in rows]
+        return list(rows)
+
+
+class FollowFeed:
+    """Queryset-like follow feed of ``user`` for ``CursorPaginator``.
+
+    Supports the subset of the ``QuerySet`` API the cursor paginator
+    relies on: ``filter`` with a ``Q`` on ``pub_date``/``pk``,
+    ``order_by``, slicing and ``values``, which yields dicts instead of
+    posts. There is no ``count``: posts present both in the timeline and
+    in a pulled source are only told apart by merging, and a numbered
+    page would read ``offset + limit`` rows from every source.
+    """
+    model = Post
+    ordered = True
+
+    def __init__(self, user, sources=None, ordering=FEED_ORDERING,
+                 fields=None):
+        self.user = user
+        self.ordering = tuple(ordering)
+        self.fields = fields
+        if sources is None:
+            sources = self._sources(user)
+        self.sources = [source.order_by(*self.ordering) for source in sources]
+
+    @staticmethod
+    def _sources(user):
+        pushed = _Source(
+            TimelineEntry.objects.filter(user=user).select_related(
+                'post__author', 'post__group'
+            ),
+            TIMELINE_FIELDS,
+        )
+        celebrities = celebrity_ids()
+        if not celebrities:
+            return [pushed]
+        followed = user.follower.filter(
+            author_id__in=celebrities
+        ).values('author_id')
+        pulled = _Source(Post.objects.filter(
+            author_id__in=followed
+        ).select_related('author', 'group'))
+        return [pushed, pulled]
+
+    def _clone(self, sources, ordering=None):
+        return FollowFeed(
+            self.user, sources, ordering or self.ordering, self.fields
+        )
+
+    def filter(self, condition):
+        return self._clone([source.filter(condition)
+                            for source in self.sources])
+
+    def order_by(self, *ordering):
+        return self._clone(self.sources, ordering)
+
+    def values(self, *fields):
+        clone = self._clone(self.sources)
+        clone.fields = fields
+        return clone
+
+    def _key(self, post):
+        if self.fields:
+            return tuple(post[name.lstrip('-')] for name in self.ordering)
+        return tuple(
+            getattr(post, name.lstrip('-')) for name in self.ordering
+        )
+
+    def _merge(self, limit):
+        started = time.monotonic()
+        streams = [
+            source.head(limit, self.fields) for source in self.sources
+        ]
+        merged = []
+        seen = set()
+        for post in heapq.merge(
+            *streams,
+            key=self._key,
+            reverse=self.ordering[0].startswith('-'),
+        ):
+            pk = post['pk'] if self.fields else post.pk
+            if pk in seen:
+                continue
+            seen.add(pk)
+            merged.append(post)
+            if len(merged) == limit:
+                break
+        metrics.observe('feed.follow.sources', len(streams))
+        metrics.observe('feed.follow.rows_fetched', sum(map(len, streams)))
+        metrics.observe('feed.follow.merge_seconds',
+                        time.monotonic() - started)
+        metrics.observe('feed.follow.celebrity_threshold',
+                        settings.FEED_CELEBRITY_THRESHOLD or 0)
+        return merged
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = index.start or 0
+            return self._merge(index.stop)[start:]
+        return self._merge(index + 1)[index]
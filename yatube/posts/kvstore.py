@@ -0,0 +1,132 @@
+"""sorl-thumbnail key-value store with batched reads.
+
+Extends the cached-db store with ``get_many``, which resolves a whole
+page of thumbnails with one ``cache.get_many`` and at most one database
+query, and with an in-process LRU of ``THUMBNAIL_KVSTORE_LRU_SIZE``
+entries in front of the cache. Only found values enter the LRU, as a
+missing record may be created by another process at any time. Records
+are also deleted, when ``sweep_images`` removes an image: the LRU of
+the sweeping process forgets them at once, the others after
+``THUMBNAIL_KVSTORE_LRU_TIMEOUT`` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+EMPTY_VALUE = cached_db_kvstore.EMPTY_VALUE
+
+
+class LRU:
+    """At most ``size`` values, each kept for ``timeout`` seconds or,
+    when it is ``None``, until evicted."""
+
+    def __init__(self, size, timeout=None):
+        self.size = size
+        self.timeout = timeout
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires is not None and expires <= time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if not self.size:
+            return
+        expires = None
+        if self.timeout is not None:
+            expires = time.monotonic() + self.timeout
+        with self.lock:
+            self.items[key] = (expires, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    def __init__(self):
+        super().__init__()
+        self.lru = LRU(
+            settings.THUMBNAIL_KVSTORE_LRU_SIZE,
+            settings.THUMBNAIL_KVSTORE_LRU_TIMEOUT,
+        )
+
+    def _get_raw(self, key):
+        value = self.lru.get(key)
+        if value is None:
+            value = super()._get_raw(key)
+            if value is not None:
+                self.lru.set(key, value)
+        return value
+
+    def _get_many_raw(self, keys):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.lru.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if not missing:
+            return found
+        cached = self.cache.get_many(missing)
+        missing = [key for key in missing if key not in cached]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            cached.update(stored)
+            self.cache.set_many({
+                key: stored.get(key, EMPTY_VALUE) for key in missing
+            }, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        for key, value in cached.items():
+            if value != EMPTY_VALUE:
+                found[key] = value
+                self.lru.set(key, value)
+        return found
+
+    def get_many(self, image_files):
+        """Stored ``image_files``, ``None`` for missing ones, in order."""
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self._get_many_raw(keys)
+        return [
+            deserialize_image_file(values[key]) if values.get(key) else None
+            for key in keys
+        ]
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self.lru.delete(key)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self.lru.delete(*keys)
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self.lru.clear()
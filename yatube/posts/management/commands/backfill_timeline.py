@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized follow feeds from Follow and Post rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', dest='username',
+            help='Rebuild the timeline of this user only.',
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Copy at most this many latest posts per followed author.',
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete existing timeline entries before backfilling.',
+        )
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.filter(
+            user__isnull=False, author__isnull=False,
+        )
+        entries = TimelineEntry.objects.all()
+        if options['username']:
+            try:
+                user = User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(
+                    'User "%s" does not exist' % options['username']
+                )
+            follows = follows.filter(user=user)
+            entries = entries.filter(user=user)
+        if options['clear']:
+            entries.delete()
+        edges = follows.order_by('user_id', 'author_id').values_list(
+            'user_id', 'author_id'
+        ).distinct()
+        count = 0
+        for user_id, author_id in edges.iterator():
+            timeline.backfill(user_id, author_id, limit=options['limit'])
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            'Backfilled %d follow edges, %d timeline entries in total.'
+            % (count, entries.count())
+        ))
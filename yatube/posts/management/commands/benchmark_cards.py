@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmarks
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Compare the render cost of the baseline feed card included '
+            'per post with the post_card tag on the first page of posts, '
+            'with and without the cached loader.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=200,
+            help='Renders of the page per variant.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Template of the included card, by default the one '
+                 'before post_card was added.',
+        )
+
+    def handle(self, *args, **options):
+        posts = list(Post.objects.select_related('author', 'group')[
+            :settings.PAGE_PER_PAGE
+        ])
+        user = posts[0].author if posts else None
+        try:
+            costs = benchmarks.card_costs(
+                posts, user,
+                benchmarks.baseline_card(options['baseline']),
+                options['repeat'],
+            )
+        except benchmarks.BenchmarkError as error:
+            raise CommandError(error)
+        self.stdout.write('%-10s %10s %10s' % ('', 'uncached', 'cached'))
+        for variant in ('include', 'post_card'):
+            self.stdout.write('%-10s %7.1f us %7.1f us' % (
+                variant, costs[variant + '_us'],
+                costs[variant + '_cached_us'],
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            'post_card is %.1fx faster uncached, %.1fx cached.' % (
+                costs['include_us'] / costs['post_card_us'],
+                costs['include_cached_us'] / costs['post_card_cached_us'],
+            )
+        ))
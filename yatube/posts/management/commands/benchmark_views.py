@@ -0,0 +1,88 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+
+from posts import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Benchmark feed views on generated data in a test database '
+            'and compare the results with a JSON baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', default='100,1000',
+            help='Comma separated numbers of generated posts.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Requests per view and scale.',
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Keep the cache between requests.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', default=settings.BENCHMARK_BASELINE)
+        parser.add_argument(
+            '--tolerance', type=float, default=settings.BENCHMARK_TOLERANCE,
+            help='Allowed slowdown as a fraction of the baseline.',
+        )
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Write the results as the new baseline.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('--scales must be comma separated integers.')
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = benchmarks.run(
+                scales,
+                repeat=options['repeat'],
+                warm=options['warm'],
+                seed=options['seed'],
+            )
+        except benchmarks.BenchmarkError as error:
+            raise CommandError(error)
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        for key, result in sorted(results.items()):
+            self.stdout.write(
+                '%-24s p50 %8.2f ms  p90 %8.2f ms  p99 %8.2f ms  '
+                'render %8.2f ms  queries %3d' % (
+                    key, result['p50_ms'], result['p90_ms'],
+                    result['p99_ms'], result['render_ms'],
+                    result['queries'],
+                )
+            )
+        path = options['baseline']
+        if options['save']:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as baseline:
+                json.dump(results, baseline, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS('Saved %s.' % path))
+            return
+        if not os.path.exists(path):
+            self.stdout.write('No baseline at %s, run with --save.' % path)
+            return
+        with open(path) as baseline:
+            regressions = benchmarks.compare(
+                results, json.load(baseline), options['tolerance']
+            )
+        if regressions:
+            raise CommandError(
+                'Views got slower than the baseline:\n%s'
+                % '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Export groups, posts, comments and follows to a gzip file '
+            'with one JSON object per line.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path of the dump to write.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Rows fetched from the database at a time.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = 0
+        for name, count in transfer.export(
+            options['path'], options['chunk_size']
+        ):
+            self.stdout.write('Exported %d %s rows.' % (count, name))
+            total += count
+        seconds = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Exported %d rows in %.1f s (%d rows/s).'
+            % (total, seconds, total / max(seconds, 1e-6))
+        ))
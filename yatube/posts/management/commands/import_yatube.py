@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search, transfer
+
+
+class Command(BaseCommand):
+    help = ('Import a dump written by export_yatube, then rebuild '
+            'timelines, counters and the search index.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path of the dump to read.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows inserted per transaction.',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Do not rebuild timelines, counters and the search index.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = 0
+        try:
+            for name, count, seconds in transfer.load(
+                options['path'], options['batch_size']
+            ):
+                self.stdout.write('Imported %d %s rows (%d rows/s).' % (
+                    count, name, count / max(seconds, 1e-6)
+                ))
+                total += count
+        except (OSError, ValueError) as error:
+            raise CommandError('Can not import %s: %s' % (
+                options['path'], error
+            ))
+        seconds = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %d rows in %.1f s (%d rows/s).'
+            % (total, seconds, total / max(seconds, 1e-6))
+        ))
+        if options['skip_rebuild']:
+            return
+        call_command(
+            'backfill_timeline', limit=settings.TIMELINE_FOLLOW_BACKFILL,
+            stdout=self.stdout,
+        )
+        call_command('reconcile_counters', stdout=self.stdout)
+        if search.enabled():
+            call_command('rebuild_search_index', stdout=self.stdout)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute post, comment and follow counters in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows recomputed per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        repaired = counters.reconcile(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Repaired %d counter rows.' % repaired
+        ))
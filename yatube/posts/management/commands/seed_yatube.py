@@ -0,0 +1,92 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import cache, search
+from posts.seed import Seeder
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Generate users, groups, posts, comments and follows with '
+            'Zipf-like distributions, deterministic from a seed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Zipf exponent, higher values make popularity steeper.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='Spread post dates over this many days.',
+        )
+        parser.add_argument(
+            '--password',
+            help='Password of generated users, unusable if omitted.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows inserted per transaction.',
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Do not rebuild timelines, counters and the search index.',
+        )
+
+    def _report(self, name, count, started):
+        seconds = time.monotonic() - started
+        self.stdout.write('Created %d %s in %.1f s (%d rows/s).' % (
+            count, name, seconds, count / max(seconds, 1e-6)
+        ))
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('At least one user is needed.')
+        if User.objects.filter(
+            username__startswith='seed%d_' % options['seed']
+        ).exists():
+            raise CommandError(
+                'Data of seed %d already exists.' % options['seed']
+            )
+        seeder = Seeder(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            exponent=options['exponent'],
+            days=options['days'],
+            password=options['password'],
+        )
+        started = time.monotonic()
+        user_ids = seeder.users(options['users'])
+        self._report('users', len(user_ids), started)
+        started = time.monotonic()
+        group_ids = seeder.groups(options['groups'])
+        self._report('groups', len(group_ids), started)
+        started = time.monotonic()
+        posts = seeder.posts(options['posts'], user_ids, group_ids)
+        self._report('posts', len(posts), started)
+        started = time.monotonic()
+        count = seeder.comments(options['comments'], user_ids, posts)
+        self._report('comments', count, started)
+        started = time.monotonic()
+        count = seeder.follows(options['follows'], user_ids)
+        self._report('follows', count, started)
+        cache.bump(cache.INDEX)
+        if not options['skip_rebuild']:
+            call_command(
+                'backfill_timeline', limit=settings.TIMELINE_FOLLOW_BACKFILL,
+                stdout=self.stdout,
+            )
+            call_command('reconcile_counters', stdout=self.stdout)
+            if search.enabled():
+                call_command('rebuild_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Seeding finished.'))
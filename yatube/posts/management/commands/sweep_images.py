@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Delete post images and thumbnails that no post uses any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=settings.IMAGE_SWEEP_GRACE,
+            help='Keep images saved less than this many seconds ago.',
+        )
+
+    def handle(self, *args, **options):
+        swept = thumbnails.sweep(options['grace'])
+        for name in swept:
+            self.stdout.write('Deleted %s' % name)
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted %d unused images.' % len(swept)
+        ))
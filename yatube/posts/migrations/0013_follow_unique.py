@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def remove_broken_follows(apps, schema_editor):
+    """Drop follows missing a side and all but the first of duplicates,
+    then recount the follow counters of the users involved."""
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    follows = Follow.objects.using(schema_editor.connection.alias)
+    affected = set()
+    broken = follows.filter(
+        models.Q(user__isnull=True) | models.Q(author__isnull=True)
+    )
+    for user_id, author_id in broken.values_list('user_id', 'author_id'):
+        affected.update((user_id, author_id))
+    broken.delete()
+    duplicates = follows.values('user_id', 'author_id').annotate(
+        first=Min('pk'), total=Count('pk'),
+    ).filter(total__gt=1)
+    for duplicate in duplicates:
+        follows.filter(
+            user_id=duplicate['user_id'], author_id=duplicate['author_id'],
+        ).exclude(pk=duplicate['first']).delete()
+        affected.update((duplicate['user_id'], duplicate['author_id']))
+    affected.discard(None)
+    for user_id in affected:
+        UserCounters.objects.using(schema_editor.connection.alias).filter(
+            user_id=user_id
+        ).update(
+            followers_count=follows.filter(author_id=user_id).count(),
+            following_count=follows.filter(user_id=user_id).count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_broken_follows, migrations.RunPython.noop
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={},
+        ),
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follow_user_author_idx',
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(help_text='Пользователь, на которого подписываются.', on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL, verbose_name='автор'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='Пользователь, который подписывается.', on_delete=django.db.models.deletion.CASCADE, related_name='follower', to=settings.AUTH_USER_MODEL, verbose_name='подписчик'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count_of(model, lookup):
+    rows = model.objects.filter(**{lookup: OuterRef('pk')}).order_by(
+    ).values(lookup).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows, output_field=models.IntegerField()), 0)
+
+
+def create_user_counters(apps, schema_editor):
+    """Create the counters of every user that has none yet."""
+    app_label, model_name = settings.AUTH_USER_MODEL.split('.')
+    User = apps.get_model(app_label, model_name)
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    users = User.objects.filter(counters__isnull=True).annotate(
+        posts_total=_count_of(Post, 'author'),
+        followers_total=_count_of(Follow, 'author'),
+        following_total=_count_of(Follow, 'user'),
+    ).values_list('pk', 'posts_total', 'followers_total', 'following_total')
+    UserCounters.objects.bulk_create((
+        UserCounters(
+            user_id=user_id, posts_count=posts, followers_count=followers,
+            following_count=following,
+        )
+        for user_id, posts, followers, following in users.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_follow_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_counters, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -33,6 +35,7 @@ class Post(models.Model):
         User,
         on_delete=models.SET_NULL,
         null=True,
+        db_index=False,
         related_name='posts',
         help_text='Автор поста',
         verbose_name='Автор поста',
@@ -40,8 +43,10 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
+        db_index=True,
         help_text='Загрузите картинку',
     )
     group = models.ForeignKey(
@@ -49,13 +54,31 @@ class Post(models.Model):
         on_delete=models.SET_NULL,
         blank=True,
         null=True,
+        db_index=False,
         related_name='posts',
         help_text='Группа, к которой будет относиться пост',
         verbose_name='Название группы',
     )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text='Число комментариев к посту (обновляется автоматически)',
+        verbose_name='Число комментариев',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        # Profile and group feeds filter by author or group and read in
+        # pub_date order; SQLite appends the id to every index, which
+        # covers the tie-break of the cursor ordering.
+        indexes = (
+            models.Index(
+                fields=('author', 'pub_date'), name='post_author_date_idx'
+            ),
+            models.Index(
+                fields=('group', 'pub_date'), name='post_group_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:settings.POST_SYMBOLS]
@@ -67,6 +90,7 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         blank=True,
         null=True,
+        db_index=False,
         related_name='comments',
         help_text='Пост, к которому относиться комментарий',
         verbose_name='Комментарий',
@@ -89,6 +113,13 @@ class Comment(models.Model):
         verbose_name='Дата публикации комментария',
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created'), name='comment_post_created_idx'
+            ),
+        )
+
     def __str__(self):
         return self.text
 
@@ -96,24 +127,96 @@ class Comment(models.Model):
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
-        on_delete=models.SET_NULL,
-        null=True,
+        on_delete=models.CASCADE,
+        db_index=False,
         related_name='follower',
         verbose_name='подписчик',
         help_text='Пользователь, который подписывается.',
     )
     author = models.ForeignKey(
         User,
-        on_delete=models.SET_NULL,
-        null=True,
+        on_delete=models.CASCADE,
         related_name='following',
         verbose_name='автор',
         help_text='Пользователь, на которого подписываются.',
     )
 
     class Meta:
-        ordering = ('-author',)
+        # The unique index also serves lookups by user.
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'
+            ),
+        )
 
     def __str__(self):
         return (f'user - {self.user} '
                 f'author - {self.author}')
+
+
+class TimelineEntry(models.Model):
+    """Post materialized into the follow feed of one user."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='подписчик',
+        help_text='Пользователь, в ленту которого попал пост.',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='пост',
+        help_text='Пост автора, на которого подписан пользователь.',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации поста',
+        help_text='Копия даты публикации поста для сортировки ленты.',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'pub_date', 'post'),
+                name='timeline_user_date_post_idx',
+            ),
+        )
+
+    def __str__(self):
+        return (f'user - {self.user_id} '
+                f'post - {self.post_id}')
+
+
+class UserCounters(models.Model):
+    """Denormalized per-user counters kept in step by ``posts.counters``."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Число подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число подписок',
+    )
+
+    def __str__(self):
+        return (f'user - {self.user_id} '
+                f'posts - {self.posts_count}')
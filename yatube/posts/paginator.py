@@ -0,0 +1,206 @@
+import base64
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.utils import timezone
+
+FEED_ORDERING = ('-pub_date', '-pk')
+COMMENT_ORDERING = ('created', 'pk')
+
+# Integers outside a signed 64-bit column overflow the database driver.
+INTEGER_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def encode_cursor(values):
+    """Pack a list of JSON-serializable ``values`` into an opaque token."""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """Unpack a token made by ``encode_cursor`` into ``length`` values."""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise InvalidCursor('That cursor is not valid')
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor('That cursor is not valid')
+    return values
+
+
+def is_integer(value):
+    """Whether ``value`` is an integer any database column can hold."""
+    return (
+        isinstance(value, int) and not isinstance(value, bool)
+        and INTEGER_RANGE[0] <= value <= INTEGER_RANGE[1]
+    )
+
+
+class CursorPage(Page):
+    """Page of a keyset paginator.
+
+    Unlike ``Page`` it knows nothing about the total number of pages,
+    only the opaque cursors of its neighbours. The cursors are computed
+    up front, so ``object_list`` may be replaced afterwards, e.g. by the
+    posts of timeline entries.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page of %s objects>' % len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """Paginate a queryset by seeking on its ordering fields.
+
+    The last field of ``ordering`` must be unique (usually ``pk``), so
+    that every row has a distinct position. No ``COUNT(*)`` and no
+    ``OFFSET`` are issued: each page is a single indexed range read.
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def _field(self, name):
+        opts = self.object_list.model._meta
+        return opts.pk if name == 'pk' else opts.get_field(name)
+
+    def encode_cursor(self, obj):
+        """Cursor of ``obj``, a model instance or a ``values()`` row."""
+        values = []
+        for name in self.fields:
+            if isinstance(obj, dict):
+                value = obj[name]
+            else:
+                value = self._field(name).value_from_object(obj)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        return encode_cursor(values)
+
+    def decode_cursor(self, cursor):
+        """Field values of ``cursor``; ``None``, out of range integers and
+        naive datetimes are never part of a cursor made here."""
+        values = decode_cursor(cursor, len(self.fields))
+        try:
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor('That cursor is not valid')
+        for value in values:
+            if (value is None
+                    or isinstance(value, int) and not is_integer(value)
+                    or isinstance(value, datetime.datetime)
+                    and settings.USE_TZ and timezone.is_naive(value)):
+                raise InvalidCursor('That cursor is not valid')
+        return values
+
+    def _seek(self, values, forward):
+        """Build ``WHERE`` condition selecting rows past ``values``."""
+        condition = Q()
+        equal = {}
+        for order, name, value in zip(self.ordering, self.fields, values):
+            descending = order.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{'%s__%s' % (name, lookup): value})
+            equal[name] = value
+        return condition
+
+    def page(self, after=None, before=None):
+        """Return the page following ``after`` or preceding ``before``."""
+        queryset = self.object_list
+        if before:
+            reverse = [
+                name[1:] if name.startswith('-') else '-' + name
+                for name in self.ordering
+            ]
+            queryset = queryset.filter(
+                self._seek(self.decode_cursor(before), forward=False)
+            ).order_by(*reverse)
+        else:
+            if after:
+                queryset = queryset.filter(
+                    self._seek(self.decode_cursor(after), forward=True)
+                )
+            queryset = queryset.order_by(*self.ordering)
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before:
+            rows.reverse()
+        has_next = has_more if not before else True
+        has_previous = has_more if before else bool(after)
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=(
+                self.encode_cursor(rows[-1]) if rows and has_next else None
+            ),
+            previous_cursor=(
+                self.encode_cursor(rows[0]) if rows and has_previous else None
+            ),
+        )
+
+    def get_page(self, after=None, before=None):
+        """Like ``page`` but fall back to the first page on a bad cursor."""
+        try:
+            return self.page(after=after, before=before)
+        except InvalidCursor:
+            return self.page()
+
+
+def paginate(request, object_list, ordering=FEED_ORDERING, cursor=None):
+    """Return the requested page of ``object_list``.
+
+    Uses keyset pagination over ``?after=``/``?before=`` when ``cursor``
+    is set, or by default when ``settings.PAGE_CURSOR_PAGINATION`` is
+    enabled, numbered pages otherwise.
+    """
+    if cursor is None:
+        cursor = settings.PAGE_CURSOR_PAGINATION
+    if cursor:
+        paginator = CursorPaginator(
+            object_list, settings.PAGE_PER_PAGE, ordering
+        )
+        return paginator.get_page(
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    paginator = Paginator(object_list, settings.PAGE_PER_PAGE)
+    return paginator.get_page(request.GET.get('page'))
+
+
+def paginate_comments(request, post):
+    """Return the page of ``post`` comments after ``?after=``, oldest first."""
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        COMMENT_ORDERING,
+    )
+    return paginator.get_page(after=request.GET.get('after'))
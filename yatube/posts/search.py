@@ -0,0 +1,163 @@
+"""Full-text search over posts backed by an SQLite FTS5 index.
+
+``posts_post_fts`` holds a copy of ``Post.text`` under the post id as
+rowid and is kept in sync by signal handlers. Results are ranked by
+``bm25`` and paginated by cursor on ``(rank, id)``. On databases other
+than SQLite search falls back to ``icontains`` ordered by date.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginator import (
+    CursorPage, InvalidCursor, decode_cursor, encode_cursor, is_integer
+)
+
+TABLE = 'posts_post_fts'
+
+# Control characters delimiting matches until the text is escaped. They
+# are removed from the indexed text, so a post containing them can not
+# open or close a highlight.
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    if not enabled():
+        return
+    text = post.text.replace(MATCH_START, '').replace(MATCH_END, '')
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid = %%s' % TABLE, [post.pk])
+        cursor.execute(
+            'INSERT INTO %s (rowid, text) VALUES (%%s, %%s)' % TABLE,
+            [post.pk, text],
+        )
+
+
+def unindex_post(post_id):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s WHERE rowid = %%s' % TABLE, [post_id])
+
+
+def rebuild_index():
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM %s' % TABLE)
+        cursor.execute(
+            "INSERT INTO %s (rowid, text) SELECT id, "
+            "replace(replace(text, char(2), ''), char(3), '') "
+            "FROM posts_post" % TABLE
+        )
+
+
+def to_match(query):
+    """Turn free text into an FTS5 query: all words, the last as prefix."""
+    words = WORD_RE.findall(query)
+    if not words:
+        return None
+    terms = ['"%s"' % word for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _highlight(text):
+    return mark_safe(
+        escape(text)
+        .replace(MATCH_START, '<mark>')
+        .replace(MATCH_END, '</mark>')
+    )
+
+
+def _ranked_ids(match, after, limit):
+    sql = (
+        'SELECT rowid, rank, highlight(%(table)s, 0, %%s, %%s) '
+        'FROM %(table)s WHERE %(table)s MATCH %%s' % {'table': TABLE}
+    )
+    params = [MATCH_START, MATCH_END, match]
+    if after is not None:
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search(query, after=None, per_page=10, queryset=None):
+    """Return a ``CursorPage`` of posts matching ``query``, best first.
+
+    Every post gets ``search_rank`` and a safe ``search_highlight`` with
+    the matched words wrapped in ``<mark>``.
+    """
+    if queryset is None:
+        queryset = Post.objects.select_related('author', 'group')
+    position = decode_cursor(after, 2) if after else None
+    if position is not None and not (
+        isinstance(position[0], (int, float)) and is_integer(position[1])
+    ):
+        raise InvalidCursor('That cursor is not valid')
+    if not enabled():
+        return _fallback(query, position, per_page, queryset)
+    match = to_match(query)
+    if match is None:
+        return CursorPage([], None)
+    rows = _ranked_ids(match, position, per_page + 1)
+    posts = queryset.in_bulk([post_id for post_id, _, _ in rows])
+    results = []
+    for post_id, rank, snippet in rows[:per_page]:
+        post = posts.get(post_id)
+        if post is None:
+            continue
+        post.search_rank = rank
+        post.search_highlight = _highlight(snippet)
+        results.append(post)
+    next_cursor = None
+    if len(rows) > per_page:
+        post_id, rank, _ = rows[per_page - 1]
+        next_cursor = encode_cursor([rank, post_id])
+    return CursorPage(results, None, next_cursor=next_cursor)
+
+
+def _fallback(query, position, per_page, queryset):
+    queryset = queryset.filter(text__icontains=query).order_by('-pk')
+    if position is not None:
+        queryset = queryset.filter(pk__lt=position[1])
+    rows = list(queryset[:per_page + 1])
+    for post in rows:
+        post.search_rank = 0
+        post.search_highlight = escape(post.text)
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor([0, rows[per_page - 1].pk])
+    return CursorPage(rows[:per_page], None, next_cursor=next_cursor)
+
+
+def filter_matching(queryset, query):
+    """Posts of ``queryset`` matching ``query``, unranked and uncapped."""
+    match = to_match(query)
+    if match is None:
+        return queryset.none()
+    opts = queryset.model._meta
+    return queryset.extra(
+        where=[
+            '%(post)s.%(id)s IN (SELECT rowid FROM %(table)s '
+            'WHERE %(table)s MATCH %%s)' % {
+                'post': connection.ops.quote_name(opts.db_table),
+                'id': connection.ops.quote_name(opts.pk.column),
+                'table': TABLE,
+            }
+        ],
+        params=[match],
+    )
@@ -0,0 +1,174 @@
+"""Deterministic synthetic data for scale testing.
+
+Post authors, followed users, groups and commented posts are drawn from
+a Zipf-like distribution: the item of rank ``r`` gets weight
+``1 / r ** exponent``, so a few users write most posts and gather most
+followers, as on a real site. All values come from one
+``random.Random(seed)`` and dates start at a fixed moment, so the same
+options always produce the same rows.
+
+Rows are inserted in batches with explicit primary keys and dates, see
+``posts.transfer.bulk_insert``, and no signals are sent.
+"""
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Comment, Follow, Group, Post
+from .transfer import bulk_insert
+
+User = get_user_model()
+
+START = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+# Share of posts published without a group.
+UNGROUPED_SHARE = 0.2
+
+WORDS = (
+    'день', 'город', 'книга', 'дорога', 'утро', 'море', 'друг', 'работа',
+    'вечер', 'письмо', 'сад', 'река', 'дом', 'окно', 'поезд', 'музыка',
+    'снег', 'лето', 'кофе', 'встреча', 'новый', 'старый', 'тихий',
+    'долгий', 'светлый', 'первый', 'простой', 'читать', 'писать', 'ждать',
+    'помнить', 'видеть', 'сегодня', 'снова', 'почти', 'очень', 'и', 'но',
+    'в', 'на',
+)
+
+
+def zipf_weights(count, exponent):
+    """Cumulative weights of ranks ``1..count`` for ``Random.choices``."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+def _next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class Seeder:
+    def __init__(self, seed=0, batch_size=1000, exponent=1.1, days=365,
+                 password=None):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.exponent = exponent
+        self.days = days
+        self.password = make_password(password)
+
+    def _insert(self, model, objs):
+        batch = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                self._flush(model, batch)
+                batch = []
+        if batch:
+            self._flush(model, batch)
+
+    def _flush(self, model, batch):
+        with transaction.atomic():
+            bulk_insert(model, batch)
+
+    def _text(self, low, high):
+        words = self.random.choices(WORDS, k=self.random.randint(low, high))
+        return ' '.join(words).capitalize()
+
+    def users(self, count):
+        first = _next_pk(User)
+        self._insert(User, (User(
+            pk=first + index,
+            username='seed%d_user%d' % (self.seed, index),
+            password=self.password,
+        ) for index in range(count)))
+        return list(range(first, first + count))
+
+    def groups(self, count):
+        first = _next_pk(Group)
+        self._insert(Group, (Group(
+            pk=first + index,
+            title=self._text(1, 3),
+            slug='seed%d-group%d' % (self.seed, index),
+            description=self._text(5, 20),
+        ) for index in range(count)))
+        return list(range(first, first + count))
+
+    def posts(self, count, user_ids, group_ids):
+        """Insert ``count`` posts; return ``(pk, pub_date)`` of each."""
+        first = _next_pk(Post)
+        authors = zipf_weights(len(user_ids), self.exponent)
+        groups = zipf_weights(len(group_ids), self.exponent)
+        step = timedelta(days=self.days) / max(count, 1)
+        dates = [
+            START + step * (index + self.random.random())
+            for index in range(count)
+        ]
+
+        def build():
+            for index, pub_date in enumerate(dates):
+                group_id = None
+                if group_ids and self.random.random() >= UNGROUPED_SHARE:
+                    group_id = self.random.choices(
+                        group_ids, cum_weights=groups
+                    )[0]
+                yield Post(
+                    pk=first + index,
+                    text=self._text(5, 60),
+                    pub_date=pub_date,
+                    author_id=self.random.choices(
+                        user_ids, cum_weights=authors
+                    )[0],
+                    group_id=group_id,
+                )
+
+        self._insert(Post, build())
+        return [(first + index, date) for index, date in enumerate(dates)]
+
+    def comments(self, count, user_ids, posts):
+        """Insert ``count`` comments, mostly under the newest posts."""
+        if not posts:
+            return 0
+        first = _next_pk(Comment)
+        newest = list(reversed(posts))
+        weights = zipf_weights(len(newest), self.exponent)
+
+        def build():
+            for index in range(count):
+                post_id, pub_date = self.random.choices(
+                    newest, cum_weights=weights
+                )[0]
+                yield Comment(
+                    pk=first + index,
+                    post_id=post_id,
+                    author_id=self.random.choice(user_ids),
+                    text=self._text(2, 20),
+                    created=pub_date + timedelta(
+                        hours=self.random.random() * 48
+                    ),
+                )
+
+        self._insert(Comment, build())
+        return count
+
+    def follows(self, count, user_ids):
+        """Insert up to ``count`` distinct follow edges, skipping self."""
+        first = _next_pk(Follow)
+        authors = zipf_weights(len(user_ids), self.exponent)
+        edges = set()
+        attempts = count * 10
+        while len(edges) < count and attempts:
+            attempts -= 1
+            user_id = self.random.choice(user_ids)
+            author_id = self.random.choices(user_ids, cum_weights=authors)[0]
+            if user_id != author_id:
+                edges.add((user_id, author_id))
+        self._insert(Follow, (
+            Follow(pk=first + index, user_id=user_id, author_id=author_id)
+            for index, (user_id, author_id) in enumerate(sorted(edges))
+        ))
+        return len(edges)
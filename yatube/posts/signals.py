@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import cache, counters, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# User fields shown on post and comment pages.
+DISPLAYED_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_followed_author(sender, instance, created, **kwargs):
+    if created and instance.user_id and instance.author_id:
+        timeline.backfill(
+            instance.user_id,
+            instance.author_id,
+            limit=settings.TIMELINE_FOLLOW_BACKFILL,
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def prune_unfollowed_author(sender, instance, **kwargs):
+    if instance.user_id and instance.author_id:
+        timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_group(sender, instance, **kwargs):
+    instance.previous_group_id = None
+    if not instance._state.adding:
+        instance.previous_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    scopes = {
+        cache.INDEX,
+        cache.post_scope(instance.pk),
+        cache.profile_scope(instance.author_id),
+        cache.group_scope(instance.group_id),
+    }
+    previous_group_id = getattr(instance, 'previous_group_id', None)
+    if previous_group_id is not None:
+        scopes.add(cache.group_scope(previous_group_id))
+    cache.bump(*scopes)
+
+
+def _post_page_scopes(posts):
+    """Scopes of the post and profile pages showing ``posts``, given as
+    ``(id, author id)`` pairs."""
+    scopes = set()
+    for post_id, author_id in posts:
+        scopes.add(cache.post_scope(post_id))
+        scopes.add(cache.profile_scope(author_id))
+    return scopes
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    # Deleting the group clears the group of its posts before post_delete.
+    instance.post_page_scopes = _post_page_scopes(
+        instance.posts.values_list('pk', 'author_id')
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, created=False, **kwargs):
+    scopes = {cache.INDEX, cache.group_scope(instance.pk)}
+    if kwargs['signal'] is post_delete:
+        scopes |= getattr(instance, 'post_page_scopes', set())
+    elif not created:
+        scopes |= _post_page_scopes(
+            instance.posts.values_list('pk', 'author_id')
+        )
+    cache.bump(*scopes)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, created, raw=False,
+                            update_fields=None, **kwargs):
+    if created or raw or (
+        update_fields is not None
+        and not DISPLAYED_USER_FIELDS & set(update_fields)
+    ):
+        return
+    scopes = {cache.INDEX, cache.profile_scope(instance.pk)}
+    for post_id, group_id in Post.objects.filter(
+        author=instance
+    ).values_list('pk', 'group_id'):
+        scopes.add(cache.post_scope(post_id))
+        if group_id is not None:
+            scopes.add(cache.group_scope(group_id))
+    commented = Comment.objects.filter(author=instance).values_list(
+        'post_id', flat=True
+    ).distinct()
+    scopes.update(cache.post_scope(post_id) for post_id in commented)
+    cache.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post(sender, instance, **kwargs):
+    cache.bump(cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    cache.bump(
+        cache.follow_scope(instance.user_id),
+        cache.profile_scope(instance.user_id),
+        cache.profile_scope(instance.author_id),
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def count_posts(sender, instance, created=True, **kwargs):
+    if created:
+        delta = 1 if kwargs['signal'] is post_save else -1
+        counters.add(instance.author_id, 'posts_count', delta)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def count_comments(sender, instance, created=True, **kwargs):
+    if created:
+        delta = 1 if kwargs['signal'] is post_save else -1
+        counters.add_comments(instance.post_id, delta)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_follows(sender, instance, created=True, **kwargs):
+    if created:
+        delta = 1 if kwargs['signal'] is post_save else -1
+        counters.add(instance.author_id, 'followers_count', delta)
+        counters.add(instance.user_id, 'following_count', delta)
+        timeline.followers_changed(instance.author_id, delta)
+
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.create_for(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post_text(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
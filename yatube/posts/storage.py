@@ -0,0 +1,101 @@
+"""Content-addressed storage of post images.
+
+An upload is hashed while it is streamed to a temporary file and stored
+under its SHA-256 digest, e.g. ``posts/3f/3fa4...c1.jpg``. Identical
+uploads share one file, and since sorl derives thumbnail names from the
+source name they share thumbnails too.
+
+Blobs are never deleted on the request path: ``posts.thumbnails.sweep``
+deletes those no post names once they are older than a grace period.
+Saving an upload whose blob exists touches it, which restarts the grace
+period while the post naming it is being saved.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+EXTENSION_RE = re.compile(r'^\.[a-z0-9]{1,5}$')
+
+BLOB_RE = re.compile(r'^(?P<digest>[0-9a-f]{64})(\.[a-z0-9]{1,5})?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # Names are chosen by _save from the content.
+        return name
+
+    def digest_name(self, name, digest):
+        """Name of the blob with ``digest`` uploaded as ``name``."""
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        if not EXTENSION_RE.match(extension):
+            extension = ''
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        directory = self.path(os.path.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        descriptor, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as blob:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    blob.write(chunk)
+            name = self.digest_name(name, digest.hexdigest())
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # New, or swept meanwhile: write it.
+                pass
+            os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+            os.replace(temporary, self.path(name))
+            temporary = None
+            if self.file_permissions_mode is not None:
+                os.chmod(self.path(name), self.file_permissions_mode)
+            return name
+        finally:
+            if temporary is not None:
+                os.remove(temporary)
+
+    def blobs(self, directory):
+        """Names of the content-addressed blobs stored under ``directory``.
+
+        Files named otherwise, e.g. uploads older than this storage, are
+        left out.
+        """
+        if not self.exists(directory):
+            return
+        prefixes, _ = self.listdir(directory)
+        for prefix in sorted(prefixes):
+            _, filenames = self.listdir(os.path.join(directory, prefix))
+            for filename in sorted(filenames):
+                match = BLOB_RE.match(filename)
+                if match and match.group('digest')[:2] == prefix:
+                    yield os.path.join(directory, prefix, filename)
+
+    def discard(self, name, saved_before):
+        """Delete blob ``name`` unless it was saved at ``saved_before``
+        (a timestamp) or later; return whether it was deleted.
+
+        The blob is moved aside before its time is checked, so a
+        concurrent ``_save`` either touched it first, and it is put
+        back, or finds no blob and writes it again.
+        """
+        path = self.path(name)
+        aside = path + '.sweep'
+        try:
+            os.replace(path, aside)
+        except FileNotFoundError:
+            return False
+        if os.path.getmtime(aside) >= saved_before:
+            os.replace(aside, path)
+            return False
+        os.remove(aside)
+        return True
@@ -0,0 +1,58 @@
+"""Post cards of the feeds.
+
+``{% post_card post %}`` renders ``posts/includes/post_list.html`` with
+the links of the card reversed in Python and memoized, instead of an
+``{% include %}`` resolving four ``{% url %}`` tags per post. Whether
+the user follows the author comes from their cached following set,
+looked up once per render, unless the feed passes ``following``.
+"""
+import functools
+
+from django import template
+from django.urls import get_script_prefix, get_urlconf, reverse
+
+from .. import follows
+
+register = template.Library()
+
+
+@functools.lru_cache(maxsize=4096)
+def _reverse(prefix, urlconf, name, arg):
+    return reverse(name, urlconf=urlconf, args=[arg])
+
+
+def url(name, arg):
+    """``reverse(name, args=[arg])``, memoized per script prefix."""
+    return _reverse(get_script_prefix(), get_urlconf(), name, arg)
+
+
+def _following_ids(context, user):
+    render_context = context.render_context
+    if 'following_ids' not in render_context:
+        render_context['following_ids'] = follows.following_ids(user.pk)
+    return render_context['following_ids']
+
+
+@register.inclusion_tag('posts/includes/post_list.html', takes_context=True)
+def post_card(context, post, following=None):
+    user = context.get('user')
+    is_author = (
+        user is not None and user.is_authenticated
+        and user.pk == post.author_id
+    )
+    if following is None:
+        following = (
+            user is not None and user.is_authenticated and not is_author
+            and post.author_id in _following_ids(context, user)
+        )
+    return {
+        'post': post,
+        'following': following,
+        'detail_url': url('posts:post_detail', post.pk),
+        'edit_url': url('posts:post_edit', post.pk) if is_author else None,
+        'group_url': (
+            url('posts:group_posts', post.group.slug)
+            if post.group_id else None
+        ),
+        'profile_url': url('posts:profile', post.author.username),
+    }
@@ -0,0 +1,20 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Look thumbnails of all ``posts`` up at once; renders nothing."""
+    thumbnails.prefetch(posts)
+    return ''
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Ready thumbnails of the post image, scheduling them when missing."""
+    if not hasattr(post, 'prefetched_thumbnails'):
+        thumbnails.prefetch([post])
+    return getattr(post, 'prefetched_thumbnails', None)
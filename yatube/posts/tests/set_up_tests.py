@@ -1,10 +1,14 @@
+import hashlib
 import tempfile
 import shutil
+from contextlib import contextmanager
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, override_settings
 from ..models import Post, Group, Comment
 
@@ -13,6 +17,20 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
 
+@contextmanager
+def on_commit():
+    """Выполняет колбэки transaction.on_commit, зарегистрированные в блоке,
+    как если бы транзакция теста зафиксировалась."""
+    start = len(connection.run_on_commit)
+    try:
+        yield
+    finally:
+        callbacks = connection.run_on_commit[start:]
+        del connection.run_on_commit[start:]
+        for _, callback in callbacks:
+            callback()
+
+
 class UserLocators:
     USERNAME = 'auth'
     USERNAME2 = 'auth2'
@@ -50,6 +68,10 @@ class PostLocators:
     GIF_FOR_TEST_NAME = 'gif_for_test.gif'
     GIF_FOR_TEST_NAME_VIEWS = 'gif_for_test2.gif'
     GIF_FOR_TEST_TYPE = 'image/gif'
+    GIF_FOR_TEST_DIGEST = hashlib.sha256(GIF_FOR_TEST).hexdigest()
+    GIF_FOR_TEST_STORED_NAME = (
+        f'posts/{GIF_FOR_TEST_DIGEST[:2]}/{GIF_FOR_TEST_DIGEST}.gif'
+    )
     IMAGE_UPLOADED = SimpleUploadedFile(
         name=GIF_FOR_TEST_NAME,
         content=GIF_FOR_TEST,
@@ -121,6 +143,7 @@ class PostTestSetUpMixin(TestCase):
     def setUpClass(cls):
         """Создаем тестового пользователя, группу и пост."""
         super().setUpClass()
+        cache.clear()
         cls.user = User.objects.create_user(username=UserLocators.USERNAME)
         cls.group = Group.objects.create(
             title=GroupLocators.TITLE,
@@ -175,3 +198,23 @@ class PostTestSetUpMixin(TestCase):
                     raise Exception(
                         'Мета параметр не определен или определен неверно'
                     )
+
+
+class PaginatorTestSetUpMixin(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Создаем тестового пользователя, группу и 13 постов."""
+        super().setUpClass()
+        cache.clear()
+        cls.user = User.objects.create_user(username=UserLocators.USERNAME)
+        cls.group = Group.objects.create(
+            title=GroupLocators.TITLE,
+            slug=GroupLocators.SLUG,
+            description=GroupLocators.DESCRIPTION,
+        )
+        for _ in range(13):
+            cls.post = Post.objects.create(
+                author=cls.user,
+                text=PostLocators.TEXT,
+                group=cls.group,
+            )
@@ -0,0 +1,61 @@
+from django.urls import reverse
+
+from posts import benchmarks
+from ..models import Post
+from .set_up_tests import PaginatorTestSetUpMixin
+
+
+class BenchmarkTests(PaginatorTestSetUpMixin):
+    def test_measure_reports_timings_and_queries(self):
+        """Замер страницы возвращает перцентили, время шаблона и запросы."""
+        result = benchmarks.measure(reverse('posts:index'), repeat=3)
+        self.assertEqual(result['queries'], 2)
+        self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertGreater(result['render_ms'], 0)
+
+    def test_card_costs_measured_per_card(self):
+        """Стоимость карточки считается для include и тега post_card.
+
+        Оба варианта замеряются с кэширующим загрузчиком и без него.
+        """
+        costs = benchmarks.card_costs(
+            Post.objects.select_related('author', 'group')[:5],
+            self.user, baseline='{{ post.text }}', repeat=2,
+        )
+        self.assertEqual(set(costs), {
+            'include_us', 'include_cached_us',
+            'post_card_us', 'post_card_cached_us',
+        })
+        self.assertTrue(all(cost > 0 for cost in costs.values()))
+
+    def test_baseline_card_shipped(self):
+        """Базовая карточка до появления post_card лежит в benchmarks."""
+        card = benchmarks.baseline_card()
+        self.assertIn("{% url 'posts:post_detail' post.id %}", card)
+        self.assertNotIn('detail_url', card)
+
+    def test_targets_cover_feed_views(self):
+        self.assertEqual(
+            [view for view, _, _ in benchmarks.targets()],
+            ['index', 'group_posts', 'profile', 'post_detail',
+             'follow_index'],
+        )
+
+    def test_compare_reports_regressions_beyond_tolerance(self):
+        """Регрессией считается замедление сверх допуска и рост запросов."""
+        baseline = {'index@100': {
+            'p50_ms': 10, 'p90_ms': 20, 'p99_ms': 30, 'render_ms': 5,
+            'queries': 2,
+        }}
+        within = {'index@100': {
+            'p50_ms': 12, 'p90_ms': 24, 'p99_ms': 90, 'render_ms': 6,
+            'queries': 2,
+        }}
+        worse = {'index@100': {
+            'p50_ms': 20, 'p90_ms': 20, 'p99_ms': 30, 'render_ms': 5,
+            'queries': 3,
+        }}
+        self.assertEqual(benchmarks.compare(within, baseline, 0.25), [])
+        self.assertEqual(benchmarks.compare(worse, baseline, 0.25), [
+            'index@100 p50_ms: 20.00 > 12.50', 'index@100 queries: 3 > 2',
+        ])
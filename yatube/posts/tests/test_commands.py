@@ -0,0 +1,207 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F, Sum
+from django.test import TestCase
+
+from ..models import (Comment, Follow, Group, Post, TimelineEntry,
+                      UserCounters)
+from .set_up_tests import GroupLocators, PostLocators, UserLocators
+
+User = get_user_model()
+
+
+class FollowedAuthorTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=UserLocators.USERNAME)
+        cls.author = User.objects.create_user(username=UserLocators.USERNAME2)
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=PostLocators.TEXT)
+            for _ in range(3)
+        ]
+
+
+class BackfillTimelineCommandTests(FollowedAuthorTestCase):
+    def test_backfill_timeline_rebuilds_entries(self):
+        """Команда восстанавливает ленту подписок из Follow и Post."""
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timeline', stdout=StringIO())
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.user
+            ).values_list('post_id', flat=True)),
+            {post.pk for post in self.posts},
+        )
+
+    def test_backfill_timeline_respects_limit(self):
+        call_command(
+            'backfill_timeline', '--clear', '--limit', '1', stdout=StringIO()
+        )
+        entry = TimelineEntry.objects.get(user=self.user)
+        self.assertEqual(entry.post, self.posts[-1])
+
+
+class ReconcileCountersCommandTests(FollowedAuthorTestCase):
+    def test_reconcile_counters_repairs_drift(self):
+        """Команда пересчитывает счетчики, испорченные update() и удалением."""
+        Comment.objects.create(
+            post=self.posts[0], author=self.user, text=PostLocators.TEXT,
+        )
+        Post.objects.update(comment_count=7)
+        UserCounters.objects.filter(user=self.author).update(posts_count=0)
+        UserCounters.objects.filter(user=self.user).delete()
+        call_command('reconcile_counters', '--batch-size', '2',
+                     stdout=StringIO())
+        self.assertEqual(
+            dict(Post.objects.values_list('pk', 'comment_count')),
+            {self.posts[0].pk: 1, self.posts[1].pk: 0, self.posts[2].pk: 0},
+        )
+        author_counters = UserCounters.objects.get(user=self.author)
+        self.assertEqual(author_counters.posts_count, 3)
+        self.assertEqual(author_counters.followers_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.user).following_count, 1
+        )
+
+
+class ExportImportCommandTests(FollowedAuthorTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'yatube.jsonl.gz')
+
+    def test_export_import_round_trip(self):
+        """Выгрузка и загрузка сохраняют записи, даты и авторов."""
+        group = Group.objects.create(
+            title=GroupLocators.TITLE, slug=GroupLocators.SLUG,
+        )
+        Post.objects.filter(pk=self.posts[0].pk).update(group=group)
+        Comment.objects.create(
+            post=self.posts[0], author=self.user, text=PostLocators.TEXT,
+        )
+        posts = list(Post.objects.order_by('pk').values_list(
+            'pk', 'text', 'pub_date', 'author__username', 'group__slug',
+        ))
+        call_command('export_yatube', self.path, '--chunk-size', '2',
+                     stdout=StringIO())
+        for model in (Group, Post, Follow, User):
+            model.objects.all().delete()
+        call_command('import_yatube', self.path, '--batch-size', '2',
+                     stdout=StringIO())
+        self.assertEqual(list(Post.objects.order_by('pk').values_list(
+            'pk', 'text', 'pub_date', 'author__username', 'group__slug',
+        )), posts)
+        self.assertEqual(Comment.objects.get().post_id, self.posts[0].pk)
+        self.assertTrue(Follow.objects.filter(
+            user__username=UserLocators.USERNAME,
+            author__username=UserLocators.USERNAME2,
+        ).exists())
+        self.assertFalse(User.objects.get(
+            username=UserLocators.USERNAME
+        ).has_usable_password())
+        self.assertEqual(TimelineEntry.objects.count(), 3)
+        self.assertEqual(
+            Post.objects.get(pk=self.posts[0].pk).comment_count, 1
+        )
+
+    def test_import_maps_groups_by_slug(self):
+        """Группа с уже существующим slug не дублируется, а посты
+        ссылаются на нее, даже если ее pk в выгрузке занят."""
+        group = Group.objects.create(
+            title=GroupLocators.TITLE, slug=GroupLocators.SLUG,
+        )
+        Post.objects.filter(pk=self.posts[0].pk).update(group=group)
+        call_command('export_yatube', self.path, stdout=StringIO())
+        Post.objects.all().delete()
+        group.delete()
+        Group.objects.create(pk=group.pk, title='other', slug='other')
+        existing = Group.objects.create(
+            title=GroupLocators.TITLE, slug=GroupLocators.SLUG,
+        )
+        call_command('import_yatube', self.path, '--skip-rebuild',
+                     stdout=StringIO())
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.get(pk=self.posts[0].pk).group, existing)
+
+    def test_import_leaves_auto_now_add_alone(self):
+        """Загрузка не отключает auto_now_add у полей моделей."""
+        call_command('export_yatube', self.path, stdout=StringIO())
+        Post.objects.all().delete()
+        call_command('import_yatube', self.path, '--skip-rebuild',
+                     stdout=StringIO())
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        self.assertEqual(
+            set(Post.objects.values_list('pub_date', flat=True)),
+            {post.pub_date for post in self.posts},
+        )
+
+    def test_import_remaps_taken_post_ids(self):
+        """Пост, чей pk занят другим постом, получает новый pk, а его
+        комментарии переносятся вместе с ним."""
+        Comment.objects.create(
+            post=self.posts[0], author=self.user,
+            text=PostLocators.COMMENT_POST_TEXT,
+        )
+        call_command('export_yatube', self.path, stdout=StringIO())
+        Post.objects.all().delete()
+        other = Post.objects.create(
+            pk=self.posts[0].pk, author=self.user,
+            text=PostLocators.EDIT_FORM_TEXT,
+        )
+        call_command('import_yatube', self.path, '--skip-rebuild',
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertEqual(Post.objects.get(pk=other.pk).text, other.text)
+        comment = Comment.objects.get()
+        self.assertNotEqual(comment.post_id, other.pk)
+        self.assertEqual(comment.post.author, self.author)
+        self.assertEqual(comment.post.pub_date, self.posts[0].pub_date)
+
+    def test_import_skips_existing_rows(self):
+        call_command('export_yatube', self.path, stdout=StringIO())
+        call_command('import_yatube', self.path, '--skip-rebuild',
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(Follow.objects.count(), 1)
+
+
+class SeedCommandTests(TestCase):
+    OPTIONS = ('--users', '20', '--groups', '3', '--posts', '60',
+               '--comments', '40', '--follows', '30', '--batch-size', '7')
+
+    def seed(self):
+        call_command('seed_yatube', *self.OPTIONS, stdout=StringIO())
+        return (
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug',
+            )),
+            list(Follow.objects.order_by('pk').values_list(
+                'user__username', 'author__username',
+            )),
+        )
+
+    def test_seed_is_deterministic(self):
+        """Одинаковый seed порождает одинаковые данные."""
+        first = self.seed()
+        for model in (Group, Post, Follow, User):
+            model.objects.all().delete()
+        self.assertEqual(self.seed(), first)
+
+    def test_seed_creates_skewed_data(self):
+        """Авторы распределены неравномерно, счетчики пересчитаны."""
+        self.seed()
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(Follow.objects.count(), 30)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        top = UserCounters.objects.order_by('-posts_count').first()
+        self.assertGreater(top.posts_count, 60 / 20)
+        self.assertEqual(
+            Comment.objects.count(),
+            Post.objects.aggregate(total=Sum('comment_count'))['total'],
+        )
@@ -1,9 +1,30 @@
-from django.test import Client
+import os
+import shutil
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from .. import thumbnails
 from ..models import Post, Comment
 from .set_up_tests import (
-    PostTestSetUpMixin, PostPagesLocators, GroupLocators, PostLocators
+    PostTestSetUpMixin, PostPagesLocators, GroupLocators, PostLocators,
+    TEMP_MEDIA_ROOT, UserLocators
 )
 
+User = get_user_model()
+
+
+def uploaded_gif(name='same_picture.gif'):
+    return SimpleUploadedFile(
+        name=name,
+        content=PostLocators.GIF_FOR_TEST,
+        content_type=PostLocators.GIF_FOR_TEST_TYPE,
+    )
+
 
 class PostCreateFormTests(PostTestSetUpMixin):
     def setUp(self):
@@ -29,7 +50,7 @@ class PostCreateFormTests(PostTestSetUpMixin):
             Post.objects.filter(
                 text=PostLocators.TEXT_FOR_FORM,
                 group=PostCreateFormTests.group,
-                image=f'posts/{PostLocators.GIF_FOR_TEST_NAME}',
+                image=PostLocators.GIF_FOR_TEST_STORED_NAME,
             ).exists()
         )
 
@@ -89,3 +110,83 @@ class CommentCreateFormTests(PostTestSetUpMixin):
         )
 
 
+class ImageStorageFormTests(PostTestSetUpMixin):
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_same_picture_stored_once(self):
+        """Повторная загрузка той же картинки не создает новый файл."""
+        self.authorized_client.post(PostPagesLocators.POST_CREATE, data={
+            'text': PostLocators.TEXT_FOR_FORM,
+            'image': uploaded_gif(),
+        })
+        post = Post.objects.get(text=PostLocators.TEXT_FOR_FORM)
+        self.assertEqual(post.image.name, self.post.image.name)
+        self.assertEqual(
+            post.image.name, PostLocators.GIF_FOR_TEST_STORED_NAME
+        )
+        directory = os.path.dirname(default_storage.path(post.image.name))
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(PostLocators.GIF_FOR_TEST_STORED_NAME)
+        ])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageSweepTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username=UserLocators.USERNAME)
+        self.addCleanup(shutil.rmtree, TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            author=self.user, text=PostLocators.TEXT, image=uploaded_gif(),
+        )
+
+    def age(self, path, seconds=3600):
+        old = time.time() - seconds
+        os.utime(path, (old, old))
+
+    def test_picture_deleted_with_last_post(self):
+        """Файл удаляется очисткой, когда на него не ссылается ни один
+        пост."""
+        first, second = self.create_post(), self.create_post()
+        path = default_storage.path(first.image.name)
+        first.delete()
+        self.assertEqual(thumbnails.sweep(0), [])
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertTrue(os.path.exists(path))
+        call_command('sweep_images', '--grace', '0', stdout=StringIO())
+        self.assertFalse(os.path.exists(path))
+
+    def test_replaced_picture_swept(self):
+        post = self.create_post()
+        name = post.image.name
+        post.image = None
+        post.save()
+        self.assertEqual(thumbnails.sweep(0), [name])
+        self.assertFalse(os.path.exists(default_storage.path(name)))
+
+    def test_reuploaded_picture_survives_sweep(self):
+        """Повторная загрузка продлевает жизнь файла, пока пост
+        сохраняется."""
+        post = self.create_post()
+        path = default_storage.path(post.image.name)
+        post.delete()
+        self.age(path)
+        storage = Post._meta.get_field('image').storage
+        self.assertEqual(storage.save('posts/again.gif', uploaded_gif()),
+                         PostLocators.GIF_FOR_TEST_STORED_NAME)
+        self.assertEqual(thumbnails.sweep(60), [])
+        self.assertTrue(os.path.exists(path))
+
+    def test_legacy_pictures_are_kept(self):
+        """Файлы, сохраненные до хранилища по хешу, не удаляются."""
+        path = default_storage.path('posts/legacy.gif')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as legacy:
+            legacy.write(PostLocators.GIF_FOR_TEST)
+        self.age(path)
+        self.assertEqual(thumbnails.sweep(0), [])
+        self.assertTrue(os.path.exists(path))
@@ -0,0 +1,21 @@
+from django.test import TestCase
+
+from posts.kvstore import LRU
+
+
+class LRUTests(TestCase):
+    def test_lru_evicts_least_recently_used(self):
+        lru = LRU(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual(list(lru.items), ['a', 'c'])
+
+    def test_lru_expires_entries(self):
+        """Записи LRU устаревают, ведь sweep_images может удалить их
+        в другом процессе."""
+        lru = LRU(2, timeout=0)
+        lru.set('a', 1)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(list(lru.items), [])
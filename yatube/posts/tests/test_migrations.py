@@ -0,0 +1,60 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class FollowUniqueMigrationTests(TransactionTestCase):
+    """Миграция 0013 чистит подписки перед ограничением уникальности."""
+    migrate_from = [('posts', '0012_feed_indexes')]
+    migrate_to = [('posts', '0013_follow_unique')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_remove_broken_follows(self):
+        """Подписки без стороны и дубликаты удаляются, счётчики
+        пересчитываются."""
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('auth', 'User')
+        Follow = apps.get_model('posts', 'Follow')
+        UserCounters = apps.get_model('posts', 'UserCounters')
+        reader, author, other = [
+            User.objects.create(username=name)
+            for name in ('reader', 'author', 'other')
+        ]
+        for user in (reader, author, other):
+            UserCounters.objects.create(
+                user=user, followers_count=9, following_count=9
+            )
+        for _ in range(3):
+            Follow.objects.create(user=reader, author=author)
+        Follow.objects.create(user=other, author=author)
+        Follow.objects.create(user=reader, author=None)
+        Follow.objects.create(user=None, author=other)
+
+        apps = self.migrate(self.migrate_to)
+        Follow = apps.get_model('posts', 'Follow')
+        UserCounters = apps.get_model('posts', 'UserCounters')
+        self.assertCountEqual(
+            Follow.objects.values_list('user_id', 'author_id'),
+            [(reader.pk, author.pk), (other.pk, author.pk)],
+        )
+        self.assertEqual(
+            dict(UserCounters.objects.values_list(
+                'user_id', 'followers_count'
+            )),
+            {reader.pk: 0, author.pk: 2, other.pk: 0},
+        )
+        self.assertEqual(
+            dict(UserCounters.objects.values_list(
+                'user_id', 'following_count'
+            )),
+            {reader.pk: 1, author.pk: 0, other.pk: 1},
+        )
@@ -1,5 +1,11 @@
 from django.conf import settings
-from .set_up_tests import PostLocators, PostTestSetUpMixin
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from ..counters import for_user
+from ..models import Comment, Follow, Post, UserCounters
+from .set_up_tests import PostLocators, PostTestSetUpMixin, UserLocators
+
+User = get_user_model()
 
 
 class PostModelTest(PostTestSetUpMixin):
@@ -36,3 +42,70 @@ class GroupModelTest(PostTestSetUpMixin):
         """Проверяем, что у модели Group корректно работает __str__."""
         group = GroupModelTest.group
         self.assertEqual(str(group), group.title, )
+
+
+class CountersModelTest(PostTestSetUpMixin):
+    def test_counters_follow_creates_and_deletes(self):
+        """Счетчики постов, комментариев и подписок обновляются сразу."""
+        follower = User.objects.create_user(username=UserLocators.USERNAME2)
+        post = Post.objects.create(author=self.user, text=PostLocators.TEXT)
+        comment = Comment.objects.create(
+            post=post, author=follower, text=PostLocators.COMMENT_POST_TEXT,
+        )
+        follow = Follow.objects.create(user=follower, author=self.user)
+        counters = UserCounters.objects.get(user=self.user)
+        self.assertEqual(counters.posts_count, 2)
+        self.assertEqual(counters.followers_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=follower).following_count, 1
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.delete()
+        counters.refresh_from_db()
+        self.assertEqual(counters.posts_count, 1)
+        self.assertEqual(counters.followers_count, 0)
+        self.assertEqual(
+            UserCounters.objects.get(user=follower).following_count, 0
+        )
+
+    def test_counters_created_with_user(self):
+        """Счетчики создаются вместе с пользователем."""
+        user = User.objects.create_user(username=UserLocators.USERNAME2)
+        counters = UserCounters.objects.get(user=user)
+        self.assertEqual(
+            (counters.posts_count, counters.followers_count,
+             counters.following_count),
+            (0, 0, 0),
+        )
+
+    def test_counters_exact_after_bulk_delete(self):
+        """Массовое удаление уменьшает счетчик ровно на число строк."""
+        for _ in range(3):
+            Post.objects.create(author=self.user, text=PostLocators.TEXT)
+        Post.objects.filter(author=self.user).delete()
+        self.assertEqual(
+            UserCounters.objects.get(user=self.user).posts_count, 0
+        )
+
+    def test_counters_without_row_are_counted_read_only(self):
+        """Счетчики пользователя без строки считаются без записи в базу."""
+        Post.objects.create(author=self.user, text=PostLocators.TEXT)
+        UserCounters.objects.filter(user=self.user).delete()
+        Post.objects.filter(author=self.user).first().delete()
+        self.assertEqual(for_user(self.user.pk).posts_count, 1)
+        self.assertFalse(
+            UserCounters.objects.filter(user=self.user).exists()
+        )
+
+
+class FollowModelTest(PostTestSetUpMixin):
+    def test_follow_models_pair_is_unique(self):
+        """Подписаться на автора дважды нельзя."""
+        reader = User.objects.create_user(username=UserLocators.USERNAME2)
+        Follow.objects.create(user=reader, author=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=reader, author=self.user)
@@ -0,0 +1,65 @@
+import re
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Follow
+from ..paginator import encode_cursor
+from .set_up_tests import PostTestSetUpMixin, PostPagesLocators
+
+User = get_user_model()
+
+
+class QueryPlanTests(PostTestSetUpMixin):
+    # A table read without an index, in old and new SQLite wording.
+    FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\S+( AS \S+)?$')
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.client.force_login(self.reader)
+
+    def plans(self, url):
+        """Планы всех SELECT-запросов страницы."""
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        with connection.cursor() as cursor:
+            for query in captured:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                yield query['sql'], [row[-1] for row in cursor.fetchall()]
+
+    def assert_indexed(self, url):
+        for sql, plan in self.plans(url):
+            for step in plan:
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotIn('TEMP B-TREE', step)
+                    self.assertIsNone(self.FULL_SCAN.search(step))
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент читают индексы без полного просмотра и сортировки."""
+        cursor = encode_cursor([self.post.pub_date.isoformat(), self.post.pk])
+        comment = encode_cursor([
+            self.comment.created.isoformat(), self.comment.pk
+        ])
+        urls = PostPagesLocators.GUEST_PAGES + (
+            PostPagesLocators.FOLLOW_INDEX,
+            reverse('posts:post_comments', args=[self.post.pk]),
+        )
+        for pagination in (False, True):
+            with override_settings(PAGE_CURSOR_PAGINATION=pagination):
+                for url in urls:
+                    self.assert_indexed(url)
+                    self.assert_indexed(
+                        url + ('?after=%s' % (
+                            comment if 'comments' in url else cursor
+                        ) if pagination else '?page=2')
+                    )
@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+
+from posts import thumbnails
+from ..models import Post
+from .set_up_tests import (
+    PostTestSetUpMixin, PostPagesLocators, PostLocators, on_commit
+)
+
+
+class ThumbnailViewsTests(PostTestSetUpMixin):
+    def setUp(self):
+        cache.clear()
+        default.kvstore.lru.clear()
+
+    def test_rolled_back_schedule_is_not_pending(self):
+        """Откаченная транзакция не оставляет пост в очереди навсегда."""
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            thumbnails.schedule(self.post)
+            1 / 0
+        self.assertNotIn(self.post.pk, thumbnails._pending)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_failed_thumbnails_not_rescheduled(self):
+        """Картинка, миниатюры которой не создались, не ставится в
+        очередь при каждом просмотре страницы."""
+        post = Post.objects.create(
+            author=self.user, text=PostLocators.TEXT,
+            image=SimpleUploadedFile('broken.gif', b'not an image'),
+        )
+        with self.assertLogs('posts.thumbnails', 'ERROR'), on_commit():
+            thumbnails.prefetch([post])
+        callbacks = len(connection.run_on_commit)
+        thumbnails.prefetch([post])
+        self.assertEqual(len(connection.run_on_commit), callbacks)
+        self.assertNotIn(post.pk, thumbnails._pending)
+
+    def test_sorl_private_hooks_exist(self):
+        """Закрепленная версия sorl содержит методы, на которые опирается
+        Backend."""
+        for name in ('_get_format', '_get_thumbnail_filename',
+                     '_create_thumbnail', 'default_options',
+                     'extra_options'):
+            with self.subTest(name=name):
+                self.assertTrue(hasattr(ThumbnailBackend, name))
+
+    def test_missing_thumbnail_renders_placeholder(self):
+        """Пока миниатюра не готова, страница показывает заглушку."""
+        response = self.client.get(PostPagesLocators.POST_DETAIL)
+        self.assertContains(response, 'aspect-ratio: 1611 / 720')
+        self.assertNotContains(response, '<img class="card-img')
+
+    def test_generated_thumbnail_replaces_placeholder(self):
+        """Готовая миниатюра попадает и в закешированные ленты."""
+        self.client.get(PostPagesLocators.POST_INDEX)
+        with on_commit():
+            thumbnails.generate(self.post.pk)
+        thumbnail = thumbnails.cached(self.post.image)
+        self.assertIsNotNone(thumbnail)
+        for url in (PostPagesLocators.POST_INDEX,
+                    PostPagesLocators.POST_DETAIL):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, thumbnail.url)
+                self.assertNotContains(response, 'aspect-ratio')
+
+    def test_thumbnail_variants_in_srcset(self):
+        """Картинка отдается набором ширин в JPEG и WebP с размерами."""
+        thumbnails.generate(self.post.pk)
+        thumbnail = thumbnails.cached(self.post.image)
+        widths = sorted(settings.THUMBNAIL_WIDTHS)
+        self.assertEqual(
+            [key for key in sorted(thumbnail.files) if key[0] == 'JPEG'],
+            [('JPEG', width) for width in widths],
+        )
+        self.assertEqual(
+            (thumbnail.width, thumbnail.height), (widths[-1], 720)
+        )
+        self.assertIn('%dw' % widths[0], thumbnail.srcset)
+        response = self.client.get(PostPagesLocators.POST_DETAIL)
+        self.assertContains(response, 'srcset="%s"' % thumbnail.srcset)
+        self.assertContains(response, 'loading="lazy"')
+        if 'WEBP' in thumbnails.FORMATS:
+            self.assertIn('.webp', thumbnail.webp_srcset)
+            self.assertContains(response, 'type="image/webp"')
+
+    def test_feed_reads_thumbnails_in_one_query(self):
+        """Миниатюры всех постов страницы читаются одним запросом."""
+        for _ in range(3):
+            Post.objects.create(
+                author=self.user, text=PostLocators.TEXT,
+                image=self.post.image.name,
+            )
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(PostPagesLocators.POST_INDEX)
+        kvstore_queries = [
+            query for query in captured
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+
+    def test_ready_thumbnails_served_from_process_memory(self):
+        """Готовые записи миниатюр повторно читаются из LRU в памяти."""
+        thumbnails.generate(self.post.pk)
+        cache.clear()
+        thumbnails.cached(self.post.image)
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(thumbnails.cached(self.post.image))
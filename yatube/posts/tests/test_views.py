@@ -1,12 +1,26 @@
+import json
 from http import HTTPStatus
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
-from ..models import Post, Group, Follow
+from django.db import connection, router
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core import db, metrics
+from posts import cache as posts_cache
+from core.middleware import QueryBudgetExceeded
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from ..models import (
+    Post, Group, Follow, TimelineEntry, Comment, UserCounters
+)
+from ..feeds import FollowFeed
+from ..paginator import encode_cursor
 from .set_up_tests import (
-    PostTestSetUpMixin, PostPagesLocators, PostLocators,
-    UserLocators, GroupLocators
+    PostTestSetUpMixin, PaginatorTestSetUpMixin, PostPagesLocators,
+    PostLocators, UserLocators, GroupLocators, on_commit
 )
 
 User = get_user_model()
@@ -71,11 +85,17 @@ class PostViewsTests(PostTestSetUpMixin):
                     first_object.group.title, GroupLocators.TITLE
                 )
                 self.assertEqual(first_object.text, PostLocators.TEXT)
-                self.assertEqual(first_object.image, f'posts/{PostLocators.GIF_FOR_TEST_NAME_VIEWS}', )
+                self.assertEqual(
+                    first_object.image, PostLocators.GIF_FOR_TEST_STORED_NAME
+                )
 
     def test_post_views_index_cache_check(self):
+        """Главная страница кешируется, пока посты не меняются через ORM
+        в обход сигналов."""
         initial_response = self.authorized_client.get(PostPagesLocators.POST_INDEX).content
-        Post.objects.get(pk=PostLocators.PK).delete()
+        Post.objects.filter(pk=PostLocators.PK).update(
+            text=PostLocators.EDIT_FORM_TEXT
+        )
         cache_response = self.authorized_client.get(PostPagesLocators.POST_INDEX).content
         self.assertEqual(
             initial_response,
@@ -88,24 +108,32 @@ class PostViewsTests(PostTestSetUpMixin):
             response_after_clear_cashe,
         )
 
+    def test_post_views_cached_pages_see_own_writes(self):
+        """Кеш страниц сбрасывается сразу после создания и удаления поста."""
+        for reverse_name in PostPagesLocators.templates_1_post:
+            with self.subTest(reverse_name=reverse_name):
+                self.authorized_client.get(reverse_name)
+                with on_commit():
+                    new_post = Post.objects.create(
+                        author=self.user,
+                        text=PostLocators.TEXT_FOR_FORM,
+                        group=self.group,
+                    )
+                self.assertContains(
+                    self.authorized_client.get(reverse_name),
+                    PostLocators.TEXT_FOR_FORM,
+                )
+                with on_commit():
+                    new_post.delete()
+                self.assertNotContains(
+                    self.authorized_client.get(reverse_name),
+                    PostLocators.TEXT_FOR_FORM,
+                )
 
-class PaginatorViewsTest(TestCase):
-    @classmethod
-    def setUpClass(cls):
-        """Создаем тестового пользователя, группу и пост."""
-        super().setUpClass()
-        cls.user = User.objects.create_user(username=UserLocators.USERNAME)
-        cls.group = Group.objects.create(
-            title=GroupLocators.TITLE,
-            slug=GroupLocators.SLUG,
-            description=GroupLocators.DESCRIPTION,
-        )
-        for _ in range(13):
-            cls.post = Post.objects.create(
-                author=cls.user,
-                text=PostLocators.TEXT,
-                group=cls.group,
-            )
+
+class PaginatorViewsTest(PaginatorTestSetUpMixin):
+    def setUp(self):
+        cache.clear()
 
     def test_post_views_first_page_contains_ten_records(self):
         """Проверяем paginator на страницах. Страница: 'posts:index',
@@ -121,6 +149,90 @@ class PaginatorViewsTest(TestCase):
                 response = self.client.get(reverse_name + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 3)
 
+    @override_settings(PAGE_CURSOR_PAGINATION=False)
+    def test_post_views_cached_pages_vary_on_page(self):
+        """Разные страницы ленты не делят один фрагмент кеша."""
+        for reverse_name in PostPagesLocators.templates_paginator:
+            with self.subTest(reverse_name=reverse_name):
+                first = self.client.get(reverse_name).content
+                second = self.client.get(reverse_name + '?page=2').content
+                self.assertNotEqual(first, second)
+
+
+@override_settings(PAGE_CURSOR_PAGINATION=True)
+class CursorPaginatorViewsTest(PaginatorViewsTest):
+    def setUp(self):
+        cache.clear()
+
+    def test_post_views_second_page_contains_three_records(self):
+        """Вторая страница открывается по курсору ?after=."""
+        for reverse_name in PostPagesLocators.templates_paginator:
+            with self.subTest(reverse_name=reverse_name):
+                first_page = self.client.get(reverse_name).context['page_obj']
+                self.assertFalse(first_page.has_previous())
+                response = self.client.get(
+                    reverse_name + '?after=' + first_page.next_cursor
+                )
+                second_page = response.context['page_obj']
+                self.assertEqual(len(second_page), 3)
+                self.assertFalse(second_page.has_next())
+                self.assertFalse(
+                    set(second_page.object_list) & set(first_page.object_list)
+                )
+
+    def test_post_views_previous_cursor_returns_first_page(self):
+        """Курсор ?before= возвращает предыдущую страницу."""
+        first_page = self.client.get(
+            PostPagesLocators.POST_INDEX
+        ).context['page_obj']
+        second_page = self.client.get(
+            PostPagesLocators.POST_INDEX + '?after=' + first_page.next_cursor
+        ).context['page_obj']
+        response = self.client.get(
+            PostPagesLocators.POST_INDEX
+            + '?before=' + second_page.previous_cursor
+        )
+        self.assertEqual(
+            list(response.context['page_obj'].object_list),
+            list(first_page.object_list),
+        )
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_post_views_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(PostPagesLocators.POST_INDEX + '?after=bad')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class QueryBudgetViewsTest(PaginatorTestSetUpMixin):
+    def setUp(self):
+        cache.clear()
+
+    def test_post_views_list_pages_load_authors_in_bulk(self):
+        """Число запросов на страницах списков не зависит от числа постов."""
+        queries = (2, 3, 4)
+        for reverse_name, expected in zip(
+            PostPagesLocators.templates_paginator, queries
+        ):
+            with self.subTest(reverse_name=reverse_name):
+                with self.assertNumQueries(expected):
+                    self.client.get(reverse_name)
+
+    @override_settings(QUERY_BUDGET=1, QUERY_BUDGET_RAISE=True)
+    def test_post_views_query_budget_exceeded_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(PostPagesLocators.POST_INDEX)
+
+    @override_settings(QUERY_BUDGET=1, QUERY_BUDGET_RAISE=True)
+    def test_post_views_query_budget_skips_writes(self):
+        """Бюджет запросов не распространяется на изменяющие views."""
+        author = User.objects.create_user(username=UserLocators.USERNAME2)
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse(
+            'posts:profile_follow', args=[author.username]
+        ))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
 
 class CommentTests(PostTestSetUpMixin):
     def setUp(self):
@@ -135,6 +247,54 @@ class CommentTests(PostTestSetUpMixin):
         text_initial = response.context['comments'][0]
         self.assertEqual(str(text_initial), PostLocators.COMMENT_POST_TEXT)
 
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_comment_views_paginated_by_cursor(self):
+        """Комментарии выводятся порциями, следующая порция отдается
+        отдельным фрагментом."""
+        with on_commit():
+            for number in range(3):
+                Comment.objects.create(
+                    post=self.post, author=self.user,
+                    text=f'comment {number}',
+                )
+        response = self.guest_client.get(PostPagesLocators.POST_DETAIL)
+        comments = response.context['comments']
+        self.assertEqual(
+            [str(comment) for comment in comments],
+            [PostLocators.COMMENT_POST_TEXT, 'comment 0'],
+        )
+        fragment_url = reverse(
+            'posts:post_comments', kwargs={'post_id': PostLocators.PK}
+        )
+        self.assertContains(response, fragment_url)
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(
+                fragment_url + '?after=' + comments.next_cursor
+            )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(
+            [str(comment) for comment in response.context['comments']],
+            ['comment 1', 'comment 2'],
+        )
+        self.assertFalse(response.context['comments'].has_next())
+
+    def test_comment_views_crafted_cursors_fall_back(self):
+        """Поддельный курсор комментариев отдает первую порцию."""
+        url = reverse(
+            'posts:post_comments', kwargs={'post_id': PostLocators.PK}
+        )
+        for cursor in (
+            encode_cursor([None, None]),
+            encode_cursor([self.comment.created.isoformat(), 10 ** 30]),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.guest_client.get(url + '?after=' + cursor)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(
+                    [str(comment) for comment in response.context['comments']],
+                    [PostLocators.COMMENT_POST_TEXT],
+                )
+
 
 class FollowViewsTests(TestCase):
     @classmethod
@@ -226,4 +386,558 @@ class FollowViewsTests(TestCase):
         self.assertNotEqual(
             len(response_user1_one),
             len(response_user2_zero),
-        )
\ No newline at end of file
+        )
+
+    def test_follow_views_unfollow_prunes_timeline(self):
+        """Подписка переносит посты автора в ленту, отписка их удаляет."""
+        post = Post.objects.create(
+            author=self.user_author,
+            text=PostLocators.TEXT,
+        )
+        self.authorized_client.get(PostPagesLocators.FOLLOW_USER_AUTHOR)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        response = self.authorized_client.get(PostPagesLocators.FOLLOW_INDEX)
+        self.assertEqual(list(response.context['page_obj']), [post])
+        self.authorized_client.get(PostPagesLocators.UNFOLLOW_USER_AUTHOR)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user).exists()
+        )
+
+    def test_follow_views_repeated_follow_is_idempotent(self):
+        """Повторная подписка не создает вторую запись."""
+        for _ in range(2):
+            self.authorized_client.get(PostPagesLocators.FOLLOW_USER_AUTHOR)
+        self.assertEqual(
+            Follow.objects.filter(
+                user=self.user, author=self.user_author,
+            ).count(),
+            1,
+        )
+
+    def test_follow_views_profile_reads_cached_following(self):
+        """Профиль узнает о подписке из кеша, а не из базы."""
+        cache.clear()
+        with on_commit():
+            self.authorized_client.get(PostPagesLocators.FOLLOW_USER_AUTHOR)
+        url = reverse('posts:profile', args=[self.user_author.username])
+        response = self.authorized_client.get(url)
+        self.assertTrue(response.context['following'])
+        follow_table = Follow._meta.db_table
+        with CaptureQueriesContext(connection) as captured:
+            response = self.authorized_client.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertFalse([
+            query for query in captured.captured_queries
+            if follow_table in query['sql']
+        ])
+        with on_commit():
+            self.authorized_client.get(
+                PostPagesLocators.UNFOLLOW_USER_AUTHOR
+            )
+        response = self.authorized_client.get(url)
+        self.assertFalse(response.context['following'])
+
+    def test_follow_views_deleting_user_deletes_follows(self):
+        """Удаление пользователя удаляет его подписки и подписчиков."""
+        author = User.objects.create_user(username='leaving')
+        Follow.objects.create(user=self.user, author=author)
+        Follow.objects.create(user=author, author=self.user)
+        author_id = author.pk
+        author.delete()
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            UserCounters.objects.get(user=self.user).followers_count, 0
+        )
+        self.assertFalse(
+            UserCounters.objects.filter(user_id=author_id).exists()
+        )
+
+
+@override_settings(FEED_CELEBRITY_THRESHOLD=2)
+class HybridFollowFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=UserLocators.USERNAME)
+        cls.author = User.objects.create_user(username=UserLocators.USERNAME2)
+        cls.celebrity = User.objects.create_user(
+            username=UserLocators.USERNAME3
+        )
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        Follow.objects.create(user=cls.user, author=cls.celebrity)
+        Follow.objects.create(user=fan, author=cls.celebrity)
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.posts = [
+            Post.objects.create(author=author, text=PostLocators.TEXT)
+            for author in (self.author, self.celebrity) * 7
+        ]
+
+    def test_follow_views_celebrity_posts_are_not_fanned_out(self):
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.celebrity).exists()
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 7
+        )
+
+    @override_settings(PAGE_CURSOR_PAGINATION=False)
+    def test_follow_views_feed_merges_pushed_and_pulled_posts(self):
+        """Лента подписок сливает посты знаменитостей и обычных авторов
+        и листается только по курсору."""
+        first_page = self.authorized_client.get(
+            PostPagesLocators.FOLLOW_INDEX + '?page=2'
+        ).context['page_obj']
+        self.assertTrue(first_page.is_cursor)
+        self.assertEqual(list(first_page), self.posts[::-1][:10])
+        second_page = self.authorized_client.get(
+            PostPagesLocators.FOLLOW_INDEX + '?after=' + first_page.next_cursor
+        ).context['page_obj']
+        self.assertEqual(list(second_page), self.posts[::-1][10:])
+        self.assertEqual(metrics.snapshot()['feed.follow.sources']['max'], 2)
+
+    @override_settings(PAGE_CURSOR_PAGINATION=True)
+    def test_follow_views_feed_merges_with_cursor_pagination(self):
+        first_page = self.authorized_client.get(
+            PostPagesLocators.FOLLOW_INDEX
+        ).context['page_obj']
+        second_page = self.authorized_client.get(
+            PostPagesLocators.FOLLOW_INDEX + '?after=' + first_page.next_cursor
+        ).context['page_obj']
+        self.assertEqual(
+            list(first_page) + list(second_page), self.posts[::-1]
+        )
+        self.assertFalse(second_page.has_next())
+
+    def test_follow_feed_pulls_celebrities_in_one_query(self):
+        """Посты всех знаменитостей читаются одним запросом."""
+        fan = User.objects.get(username='fan')
+        for name in ('celebrity2', 'celebrity3'):
+            celebrity = User.objects.create_user(username=name)
+            Follow.objects.create(user=self.user, author=celebrity)
+            Follow.objects.create(user=fan, author=celebrity)
+            Post.objects.create(author=celebrity, text=name)
+        cache.clear()
+        feed = FollowFeed(self.user)
+        with self.assertNumQueries(2):
+            posts = feed[:3]
+        self.assertEqual(
+            [post.text for post in posts], ['celebrity3', 'celebrity2']
+            + [PostLocators.TEXT]
+        )
+
+
+@override_settings(FEED_CELEBRITY_THRESHOLD=2)
+class CelebrityThresholdTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=UserLocators.USERNAME)
+        self.fan = User.objects.create_user(username=UserLocators.USERNAME2)
+        self.celebrity = User.objects.create_user(
+            username=UserLocators.USERNAME3
+        )
+        Follow.objects.create(user=self.user, author=self.celebrity)
+        Follow.objects.create(user=self.fan, author=self.celebrity)
+        self.post = Post.objects.create(
+            author=self.celebrity, text=PostLocators.TEXT
+        )
+
+    def test_follow_views_author_below_threshold_is_pushed(self):
+        """Автор, переставший быть знаменитостью, не пропадает из ленты."""
+        self.assertFalse(TimelineEntry.objects.exists())
+        Follow.objects.filter(user=self.fan).delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post
+        ).exists())
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(PostPagesLocators.FOLLOW_INDEX)
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+
+
+class SearchViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=UserLocators.USERNAME)
+        cls.best = Post.objects.create(
+            author=cls.user, text='Котики котики <b>котики</b>',
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Про котиков и собак, и еще много слов',
+        )
+        Post.objects.create(author=cls.user, text='Только собаки')
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:search'), {'q': query, **params}
+        ).context['page_obj']
+
+    def test_search_views_ranked_and_highlighted(self):
+        """Поиск находит посты по префиксу слова, лучшие первыми,
+        и подсвечивает совпадения, экранируя HTML."""
+        page = self.search('котик')
+        self.assertEqual(list(page), [self.best, self.other])
+        self.assertIn('<mark>Котики</mark>', page[0].search_highlight)
+        self.assertIn('&lt;b&gt;<mark>котики</mark>', page[0].search_highlight)
+
+    @override_settings(PAGE_PER_PAGE=1)
+    def test_search_views_cursor_pagination(self):
+        first_page = self.search('котик')
+        second_page = self.search('котик', after=first_page.next_cursor)
+        self.assertEqual(list(first_page), [self.best])
+        self.assertEqual(list(second_page), [self.other])
+        self.assertFalse(second_page.has_next())
+
+    def test_search_views_markers_in_text_not_highlighted(self):
+        """Управляющие символы подсветки в тексте поста не дают <mark>."""
+        Post.objects.create(
+            author=self.user, text='\x02Попугай\x03 и попугаи\x02',
+        )
+        page = self.search('попуга')
+        self.assertEqual(
+            page[0].search_highlight,
+            '<mark>Попугай</mark> и <mark>попугаи</mark>',
+        )
+
+    def test_search_views_crafted_cursor_falls_back(self):
+        page = self.search('котик', after=encode_cursor([None, 10 ** 30]))
+        self.assertEqual(list(page), [self.best, self.other])
+
+    def test_search_views_index_follows_edits_and_deletes(self):
+        other = Post.objects.get(pk=self.other.pk)
+        other.text = 'Теперь только про собак'
+        other.save()
+        Post.objects.get(pk=self.best.pk).delete()
+        self.assertEqual(list(self.search('котик')), [])
+        self.assertEqual(len(self.search('собак')), 2)
+
+    def test_search_views_admin_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котик'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class ApiViewsTests(PaginatorTestSetUpMixin):
+    def test_api_views_feeds_paginated_by_cursor(self):
+        """API лент отдает JSON постранично по курсору."""
+        for name, kwargs in (
+            ('posts:api_index', {}),
+            ('posts:api_group_posts', {'slug': GroupLocators.SLUG}),
+            ('posts:api_profile', {'username': UserLocators.USERNAME}),
+        ):
+            with self.subTest(name=name):
+                url = reverse(name, kwargs=kwargs)
+                first_page = self.client.get(url).json()
+                self.assertEqual(len(first_page['results']), 10)
+                self.assertEqual(
+                    first_page['results'][0]['author'], UserLocators.USERNAME
+                )
+                second_page = self.client.get(
+                    url, {'after': first_page['next']}
+                ).json()
+                self.assertEqual(len(second_page['results']), 3)
+                self.assertIsNone(second_page['next'])
+
+    def test_api_views_crafted_cursors_rejected(self):
+        """Курсоры с null, огромным pk и датой без зоны отклоняются."""
+        pub_date = self.post.pub_date.isoformat()
+        for cursor in (
+            encode_cursor([None, None]),
+            encode_cursor([pub_date, 10 ** 30]),
+            encode_cursor(['2020-01-01T00:00:00', self.post.pk]),
+        ):
+            for params in ({}, {'format': 'ndjson'}):
+                with self.subTest(cursor=cursor, params=params):
+                    response = self.client.get(
+                        reverse('posts:api_index'),
+                        {'after': cursor, **params},
+                    )
+                    self.assertEqual(response.status_code, 400)
+
+    def test_api_views_ndjson_streams_whole_feed(self):
+        with self.settings(API_STREAM_CHUNK_SIZE=4):
+            response = self.client.get(
+                reverse('posts:api_index'), {'format': 'ndjson'}
+            )
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        ids = [json.loads(line)['id'] for line in lines]
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-pk')
+                      .values_list('pk', flat=True)),
+        )
+
+    def test_api_views_follow_and_detail(self):
+        follow_url = reverse('posts:api_follow_index')
+        self.assertEqual(self.client.get(follow_url).status_code, 401)
+        reader = User.objects.create_user(username=UserLocators.USERNAME2)
+        Follow.objects.create(user=reader, author=self.user)
+        self.client.force_login(reader)
+        self.assertEqual(
+            len(self.client.get(follow_url).json()['results']), 10
+        )
+        post = self.client.get(reverse(
+            'posts:api_post_detail', kwargs={'post_id': self.post.pk}
+        )).json()
+        self.assertEqual(post['id'], self.post.pk)
+        self.assertEqual(post['group'], GroupLocators.SLUG)
+
+
+class ConditionalGetTests(PostTestSetUpMixin):
+    pages = PostPagesLocators.GUEST_PAGES
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_pages_not_modified(self):
+        """Неизмененная страница отвечает 304 без рендеринга шаблона."""
+        for url in self.pages:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertEqual(response.templates, [])
+
+    def test_changed_pages_rendered_again(self):
+        """После нового комментария страницы отдаются заново."""
+        etags = {url: self.client.get(url)['ETag'] for url in self.pages}
+        with on_commit():
+            Post.objects.create(
+                author=self.user, text=PostLocators.TEXT, group=self.group,
+            )
+            Comment.objects.create(
+                post=self.post, author=self.user, text=PostLocators.TEXT,
+            )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_versions_bumped_on_commit(self):
+        """Страница, закешированная до фиксации записи, сбрасывается
+        после фиксации."""
+        with on_commit():
+            Post.objects.create(author=self.user, text=PostLocators.TEXT)
+            version = posts_cache.versions(posts_cache.INDEX)
+        self.assertNotEqual(posts_cache.versions(posts_cache.INDEX), version)
+
+    def test_follow_changes_follower_profile(self):
+        """Подписка меняет ETag профиля подписчика: на нем число
+        подписок."""
+        author = User.objects.create_user(username=UserLocators.USERNAME2)
+        etag = self.client.get(PostPagesLocators.POST_PROFILE)['ETag']
+        for change in (
+            lambda: Follow.objects.create(user=self.user, author=author),
+            lambda: Follow.objects.filter(user=self.user).delete(),
+        ):
+            change()
+            response = self.client.get(
+                PostPagesLocators.POST_PROFILE, HTTP_IF_NONE_MATCH=etag
+            )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            etag = response['ETag']
+
+    def test_etag_depends_on_user(self):
+        etag = self.client.get(PostPagesLocators.POST_INDEX)['ETag']
+        self.client.force_login(self.user)
+        response = self.client.get(
+            PostPagesLocators.POST_INDEX, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class AnonymousPageCacheTests(PostTestSetUpMixin):
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_served_from_cache(self):
+        """Повторный анонимный запрос не рендерит шаблоны."""
+        for url in PostPagesLocators.GUEST_PAGES:
+            with self.subTest(url=url):
+                self.client.get(url)
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(response.templates, [])
+        with self.assertNumQueries(0):
+            self.client.get(PostPagesLocators.POST_INDEX)
+
+    def test_cached_pages_invalidated_by_writes(self):
+        """Новый пост и комментарий сбрасывают закешированные страницы."""
+        for url in PostPagesLocators.GUEST_PAGES:
+            self.client.get(url)
+        with on_commit():
+            Post.objects.create(
+                author=self.user, text=PostLocators.TEXT_FOR_FORM,
+                group=self.group,
+            )
+            Comment.objects.create(
+                post=self.post, author=self.user,
+                text=PostLocators.COMMENT_POST_TEXT_FORM,
+            )
+        for url in PostPagesLocators.GUEST_PAGES[:3]:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.client.get(url), PostLocators.TEXT_FOR_FORM
+                )
+        self.assertContains(
+            self.client.get(PostPagesLocators.POST_DETAIL),
+            PostLocators.COMMENT_POST_TEXT_FORM,
+        )
+
+    def test_cached_pages_follow_author_and_group_changes(self):
+        """Новое имя автора и название группы видны на закешированных
+        страницах."""
+        for url in PostPagesLocators.GUEST_PAGES:
+            self.client.get(url)
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name, user.last_name = 'Лев', 'Толстой'
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Переименованная группа'
+        with on_commit():
+            user.save()
+            group.save()
+        for url in PostPagesLocators.GUEST_PAGES:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Лев Толстой')
+        self.assertContains(
+            self.client.get(PostPagesLocators.POST_DETAIL), group.title
+        )
+
+    def test_cached_profile_follows_subscriptions(self):
+        """Подписка меняет число подписок на закешированном профиле
+        подписчика."""
+        author = User.objects.create_user(username=UserLocators.USERNAME2)
+        self.assertContains(
+            self.client.get(PostPagesLocators.POST_PROFILE), 'подписок: 0'
+        )
+        with on_commit():
+            Follow.objects.create(user=self.user, author=author)
+        self.assertContains(
+            self.client.get(PostPagesLocators.POST_PROFILE), 'подписок: 1'
+        )
+
+    def test_login_keeps_cached_pages(self):
+        """Вход пользователя, сохраняющий только last_login, не сбрасывает
+        кеш его страниц."""
+        version = posts_cache.versions(posts_cache.INDEX)
+        with on_commit():
+            User.objects.get(pk=self.user.pk).save(
+                update_fields=['last_login']
+            )
+        self.assertEqual(posts_cache.versions(posts_cache.INDEX), version)
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.get(PostPagesLocators.POST_INDEX)
+        self.client.force_login(self.user)
+        response = self.client.get(PostPagesLocators.POST_INDEX)
+        self.assertNotEqual(response.templates, [])
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaViewsTests(PostTestSetUpMixin):
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_writes_pin_user_to_primary(self):
+        """После записи пользователь читает с основной базы."""
+        for url, data in (
+            (PostPagesLocators.POST_CREATE, {'text': PostLocators.TEXT}),
+            (PostPagesLocators.ADD_COMMENT,
+             {'text': PostLocators.COMMENT_POST_TEXT_FORM}),
+        ):
+            with self.subTest(url=url):
+                response = self.authorized_client.post(url, data)
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+                self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_reads_do_not_pin(self):
+        """Чтение и редирект гостя на вход не закрепляют за основной базой."""
+        for client, url in (
+            (self.authorized_client, PostPagesLocators.POST_INDEX),
+            (self.authorized_client, PostPagesLocators.POST_CREATE),
+            (self.client, PostPagesLocators.POST_CREATE),
+        ):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertNotIn(
+                    settings.REPLICA_PIN_COOKIE, response.cookies
+                )
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_recent_writes_read_from_primary(self):
+        """Страница недавно измененной области строится с основной базы."""
+        with db.replica_reads():
+            posts_cache.versions(posts_cache.INDEX)
+            self.assertEqual(router.db_for_read(Post), 'replica')
+            with on_commit():
+                posts_cache.bump(posts_cache.INDEX)
+            posts_cache.versions(posts_cache.INDEX)
+            self.assertEqual(router.db_for_read(Post), 'default')
+
+
+class PostCardTests(PostTestSetUpMixin):
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_post_card_links(self):
+        """Карточка поста ведет на пост, группу и автора."""
+        response = self.client.get(PostPagesLocators.POST_INDEX)
+        for url in (
+            PostPagesLocators.POST_DETAIL,
+            reverse('posts:group_posts', args=[GroupLocators.SLUG]),
+            PostPagesLocators.POST_PROFILE,
+        ):
+            with self.subTest(url=url):
+                self.assertContains(response, 'href="%s"' % url)
+        self.assertNotContains(response, PostPagesLocators.POST_EDIT)
+
+    def test_post_card_edit_link_for_author(self):
+        """Автор видит в карточке ссылку на редактирование."""
+        response = self.authorized_client.get(PostPagesLocators.POST_INDEX)
+        self.assertContains(response, PostPagesLocators.POST_EDIT)
+
+    def test_post_card_marks_followed_authors(self):
+        """Карточка отмечает авторов, на которых подписан пользователь."""
+        reader = User.objects.create_user(username=UserLocators.USERNAME2)
+        client = Client()
+        client.force_login(reader)
+        marker = '(вы подписаны)'
+        self.assertNotContains(
+            client.get(PostPagesLocators.POST_INDEX), marker
+        )
+        with on_commit():
+            Follow.objects.create(user=reader, author=self.user)
+        self.assertContains(client.get(PostPagesLocators.POST_INDEX), marker)
+        self.assertNotContains(
+            self.authorized_client.get(PostPagesLocators.POST_INDEX), marker
+        )
+
+    def test_follow_feed_cards_not_marked(self):
+        """В ленте подписок карточки не отмечаются: подписаны на всех."""
+        reader = User.objects.create_user(username=UserLocators.USERNAME2)
+        Follow.objects.create(user=reader, author=self.user)
+        client = Client()
+        client.force_login(reader)
+        response = client.get(PostPagesLocators.FOLLOW_INDEX)
+        self.assertContains(response, PostPagesLocators.POST_DETAIL)
+        self.assertNotContains(response, '(вы подписаны)')
@@ -0,0 +1,352 @@
+"""Post image thumbnails generated off the request path.
+
+Views schedule thumbnails when a form saves an image; a thread pool
+renders them with sorl after the transaction commits. Every image gets
+a crop of the feed card at each of ``THUMBNAIL_WIDTHS``, as JPEG and,
+when Pillow supports it, WebP, decoding the source once. Templates only
+look thumbnails up in sorl's key-value store and show a placeholder
+while they are missing, so no request decodes or crops an image. When
+thumbnails are ready the cache versions of the pages showing the post
+are bumped. Images that fail to render are retried with a backoff
+instead of on every page showing them.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+from django.db import connection, transaction
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import timing
+
+from . import cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Size of the feed card crop; variants keep its aspect ratio.
+WIDTH, HEIGHT = 1611, 720
+OPTIONS = {'crop': 'center', 'upscale': True}
+
+FORMATS = ('JPEG', 'WEBP') if features.check('webp') else ('JPEG',)
+
+# Image name -> (failures, time of the next attempt).
+FAILED_KEY = 'posts:thumbnails-failed:%s'
+
+
+def geometry(width):
+    return '%dx%d' % (width, round(width * HEIGHT / WIDTH))
+
+
+def variants():
+    """``(format, width, geometry, options)`` of every thumbnail."""
+    return [
+        (format_, width, geometry(width), dict(OPTIONS, format=format_))
+        for format_ in FORMATS
+        for width in sorted(settings.THUMBNAIL_WIDTHS)
+    ]
+
+
+class Backend(ThumbnailBackend):
+    """sorl backend looking thumbnails up without rendering them and
+    rendering several of them from one decoded source.
+
+    Builds on private methods of sorl's ``ThumbnailBackend``, which is
+    why requirements.txt pins sorl-thumbnail to an exact version.
+    """
+
+    def _options(self, source, options):
+        """Complete ``options`` the way ``get_thumbnail`` does."""
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """The ``ImageFile`` ``get_thumbnail`` would store, not rendered."""
+        source = ImageFile(file_)
+        options = self._options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+    def create_thumbnails(self, file_, sizes):
+        """Render ``(geometry, options)`` pairs decoding ``file_`` once."""
+        source = ImageFile(file_)
+        missing, render = [], []
+        for geometry_string, options in sizes:
+            options = self._options(source, options)
+            thumbnail = ImageFile(
+                self._get_thumbnail_filename(source, geometry_string, options),
+                default.storage,
+            )
+            if default.kvstore.get(thumbnail):
+                continue
+            missing.append(thumbnail)
+            # Like get_thumbnail, keep files the storage already has.
+            if (sorl_settings.THUMBNAIL_FORCE_OVERWRITE
+                    or not thumbnail.exists()):
+                render.append((geometry_string, options, thumbnail))
+        if render:
+            source_image = default.engine.get_image(source)
+            try:
+                image_info = default.engine.get_image_info(source_image)
+                source.set_size(default.engine.get_image_size(source_image))
+                for geometry_string, options, thumbnail in render:
+                    options['image_info'] = image_info
+                    self._create_thumbnail(
+                        source_image, geometry_string, options, thumbnail
+                    )
+            finally:
+                default.engine.cleanup(source_image)
+        if missing:
+            default.kvstore.get_or_set(source)
+        for thumbnail in missing:
+            default.kvstore.set(thumbnail, source)
+
+
+backend = Backend()
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+class Thumbnails:
+    """Ready variants of one image, keyed by ``(format, width)``."""
+
+    def __init__(self, files):
+        self.files = files
+        self.default = files[max(
+            key for key in files if key[0] == 'JPEG'
+        )]
+
+    @property
+    def url(self):
+        return self.default.url
+
+    @property
+    def width(self):
+        return self.default.width
+
+    @property
+    def height(self):
+        return self.default.height
+
+    def _srcset(self, format_):
+        return ', '.join(
+            '%s %dw' % (thumbnail.url, width)
+            for (variant, width), thumbnail in sorted(self.files.items())
+            if variant == format_
+        )
+
+    @property
+    def srcset(self):
+        return self._srcset('JPEG')
+
+    @property
+    def webp_srcset(self):
+        return self._srcset('WEBP')
+
+
+def _lookup(images):
+    """Ready ``Thumbnails`` of each of ``images`` or ``None``, in order.
+
+    All variants of all images are read from the key-value store in one
+    batch. An image gets ``None`` until its largest JPEG exists; other
+    variants join the ``srcset`` as they appear.
+    """
+    wanted = [
+        (index, format_, width,
+         backend.thumbnail_file(image.name, geometry_string, **options))
+        for index, image in enumerate(images)
+        for format_, width, geometry_string, options in variants()
+    ]
+    kvstore = default.kvstore
+    image_files = [image_file for _, _, _, image_file in wanted]
+    if hasattr(kvstore, 'get_many'):
+        found = kvstore.get_many(image_files)
+    else:
+        found = [kvstore.get(image_file) for image_file in image_files]
+    files = [{} for _ in images]
+    for (index, format_, width, _), thumbnail in zip(wanted, found):
+        if thumbnail:
+            files[index][format_, width] = thumbnail
+    largest = ('JPEG', max(settings.THUMBNAIL_WIDTHS))
+    return [
+        Thumbnails(variant_files) if largest in variant_files else None
+        for variant_files in files
+    ]
+
+
+def cached(image):
+    """Ready ``Thumbnails`` of ``image`` or ``None``."""
+    if not image:
+        return None
+    return _lookup([image])[0]
+
+
+def _record_failure(name):
+    """Put off new attempts at ``name``, twice as long as the last time."""
+    key = FAILED_KEY % name
+    failures = (django_cache.get(key) or (0, 0))[0] + 1
+    delay = min(
+        settings.THUMBNAIL_RETRY_DELAY * 2 ** min(failures - 1, 32),
+        settings.THUMBNAIL_RETRY_MAX_DELAY,
+    )
+    # Remembered past the next attempt, so a new failure backs off more.
+    django_cache.set(
+        key, (failures, time.time() + delay),
+        delay + settings.THUMBNAIL_RETRY_MAX_DELAY,
+    )
+
+
+def _failing(names):
+    """Those of ``names`` whose last attempt failed not long ago."""
+    if not names:
+        return set()
+    found = django_cache.get_many([FAILED_KEY % name for name in names])
+    now = time.time()
+    return {
+        name for name in names
+        if found.get(FAILED_KEY % name, (0, 0))[1] > now
+    }
+
+
+def prefetch(posts):
+    """Set ``prefetched_thumbnails`` of ``posts`` with one batched lookup.
+
+    Posts whose thumbnails are missing are scheduled, unless rendering
+    them failed recently.
+    """
+    posts = [post for post in posts if post.image]
+    with timing.measure('thumbnails'):
+        found = _lookup([post.image for post in posts])
+    missing = []
+    for post, thumbnails in zip(posts, found):
+        post.prefetched_thumbnails = thumbnails
+        if thumbnails is None:
+            missing.append(post)
+    failing = _failing([post.image.name for post in missing])
+    for post in missing:
+        if post.image.name not in failing:
+            schedule(post)
+
+
+def generate(post_id):
+    """Render the thumbnails of a post and refresh the pages showing it."""
+    post = None
+    try:
+        post = Post.objects.filter(pk=post_id).only(
+            'image', 'author_id', 'group_id'
+        ).first()
+        if post is None or not post.image:
+            return
+        with timing.measure('thumbnails'):
+            backend.create_thumbnails(post.image.name, [
+                (geometry_string, options)
+                for _, _, geometry_string, options in variants()
+            ])
+        django_cache.delete(FAILED_KEY % post.image.name)
+        cache.bump(
+            cache.INDEX,
+            cache.post_scope(post.pk),
+            cache.profile_scope(post.author_id),
+            cache.group_scope(post.group_id),
+        )
+    except Exception:
+        logger.exception('Can not create thumbnails of post %s', post_id)
+        if post is not None and post.image:
+            _record_failure(post.image.name)
+    finally:
+        with _lock:
+            _pending.discard(post_id)
+
+
+def _run(post_id):
+    try:
+        generate(post_id)
+    finally:
+        connection.close()
+
+
+def schedule(post):
+    """Generate the thumbnails of ``post`` once the transaction commits.
+
+    With ``THUMBNAIL_WORKERS`` set to 0 it is generated synchronously.
+    A post is marked pending only once the transaction commits, so a
+    rollback can not leave it marked and never scheduled again.
+    """
+    if not post.image:
+        return
+    post_id = post.pk
+
+    def submit():
+        with _lock:
+            if post_id in _pending:
+                return
+            _pending.add(post_id)
+        if settings.THUMBNAIL_WORKERS:
+            _pool().submit(_run, post_id)
+        else:
+            generate(post_id)
+
+    transaction.on_commit(submit)
+
+
+def _unused(names):
+    used = set(Post.objects.filter(image__in=names).values_list(
+        'image', flat=True
+    ))
+    return [name for name in names if name not in used]
+
+
+def sweep(grace, batch_size=500):
+    """Delete image blobs and their thumbnails no post names.
+
+    Only blobs saved more than ``grace`` seconds ago are deleted, so
+    a post being saved with an existing blob keeps it (see
+    ``posts.storage``). Return the names deleted.
+    """
+    field = Post._meta.get_field('image')
+    saved_before = time.time() - grace
+    candidates = [
+        name for name in field.storage.blobs(field.upload_to)
+        if field.storage.get_modified_time(name).timestamp() < saved_before
+    ]
+    swept = []
+    for start in range(0, len(candidates), batch_size):
+        for name in _unused(candidates[start:start + batch_size]):
+            if field.storage.discard(name, saved_before):
+                backend.delete(name, delete_file=False)
+                swept.append(name)
+    return swept
@@ -0,0 +1,133 @@
+"""Materialized follow feed (fan-out on write).
+
+Every post is copied into the timeline of each follower of its author,
+so the follow page is a range read on ``(user, pub_date)`` no matter
+how many authors the user follows.
+
+Authors with at least ``settings.FEED_CELEBRITY_THRESHOLD`` followers
+are not fanned out: their posts are pulled at read time by
+``posts.feeds.FollowFeed``. An author crossing the threshold upwards
+keeps the entries pushed so far. An author dropping below it has its
+latest posts pushed to all followers once the unfollow commits, see
+``followers_changed``; ``backfill_timeline`` rebuilds timelines from
+scratch.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow, Post, TimelineEntry, UserCounters
+
+
+CELEBRITIES_CACHE_KEY = 'posts:timeline:celebrities'
+
+
+def celebrity_ids():
+    """Ids of authors whose posts are pulled instead of pushed."""
+    threshold = settings.FEED_CELEBRITY_THRESHOLD
+    if threshold is None:
+        return frozenset()
+    ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if ids is None:
+        ids = frozenset(UserCounters.objects.filter(
+            followers_count__gte=threshold
+        ).values_list('user_id', flat=True))
+        cache.set(
+            CELEBRITIES_CACHE_KEY, ids,
+            settings.FEED_CELEBRITY_CACHE_TIMEOUT,
+        )
+    return ids
+
+
+def is_celebrity(author_id):
+    return author_id in celebrity_ids()
+
+
+def _bulk_insert(entries):
+    entries = iter(entries)
+    batch_size = settings.TIMELINE_BATCH_SIZE
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Push ``post`` into the timelines of its author's followers."""
+    if post.author_id is None or is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id, user__isnull=False,
+    ).order_by().values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id, author_id, limit=None):
+    """Copy the latest posts of ``author_id`` into ``user_id`` timeline."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')
+    if limit is not None:
+        posts = posts[:limit]
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def push_author(author_id, limit=None):
+    """Copy the latest posts of ``author_id`` into all followers' timelines."""
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date'
+    ).values_list('pk', 'pub_date')
+    if limit is not None:
+        posts = posts[:limit]
+    posts = list(posts)
+    followers = Follow.objects.filter(author_id=author_id).order_by(
+    ).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id in followers.iterator()
+        for post_id, pub_date in posts
+    )
+
+
+def _rebalance(author_id):
+    threshold = settings.FEED_CELEBRITY_THRESHOLD
+    followers = UserCounters.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if followers is not None and followers < threshold:
+        push_author(author_id, limit=settings.TIMELINE_FOLLOW_BACKFILL)
+    # Readers pull the posts until the cached split is dropped.
+    cache.delete(CELEBRITIES_CACHE_KEY)
+
+
+def followers_changed(author_id, delta):
+    """Move ``author_id`` between pull and push when ``delta`` followers
+    take it across ``FEED_CELEBRITY_THRESHOLD``."""
+    threshold = settings.FEED_CELEBRITY_THRESHOLD
+    if threshold is None:
+        return
+    followers = UserCounters.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if followers is None:
+        return
+    if (followers - delta >= threshold) != (followers >= threshold):
+        transaction.on_commit(lambda: _rebalance(author_id))
+
+
+def prune(user_id, author_id):
+    """Drop posts of ``author_id`` from ``user_id`` timeline."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id,
+    ).delete()
@@ -0,0 +1,271 @@
+"""Streaming export and import of groups, posts, comments and follows.
+
+The dump is a gzip-compressed file with one JSON object per line:
+``{"model": "post", "data": {...}}``. Models follow each other in
+dependency order, users are referenced by username and groups by slug.
+Posts and comments keep their primary keys unless another row has
+taken them. Image files are not copied, only their names.
+"""
+import gzip
+import json
+import time
+from datetime import datetime
+from itertools import groupby, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from . import cache
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Model name -> (model, exported values() fields).
+MODELS = {
+    'group': (Group, ('pk', 'title', 'slug', 'description')),
+    'post': (Post, ('pk', 'text', 'pub_date', 'author__username',
+                    'group__slug', 'image')),
+    'comment': (Comment, ('pk', 'post_id', 'author__username', 'text',
+                          'created')),
+    'follow': (Follow, ('pk', 'user__username', 'author__username')),
+}
+
+
+def _encode(value):
+    # DjangoJSONEncoder cuts datetimes to milliseconds.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('%r is not JSON serializable' % value)
+
+
+def export(path, chunk_size):
+    """Write all rows to ``path``; yield ``(model name, rows)`` per model."""
+    with gzip.open(path, 'wt', encoding='utf-8') as dump:
+        for name, (model, fields) in MODELS.items():
+            rows = model.objects.order_by('pk').values(*fields)
+            count = 0
+            for row in rows.iterator(chunk_size=chunk_size):
+                dump.write(json.dumps(
+                    {'model': name, 'data': row},
+                    default=_encode, ensure_ascii=False,
+                ))
+                dump.write('\n')
+                count += 1
+            yield name, count
+
+
+class _Users:
+    """Map usernames to ids, creating unknown users without a password."""
+
+    def __init__(self):
+        self.ids = {None: None}
+
+    def resolve(self, usernames):
+        missing = set(usernames) - set(self.ids)
+        if not missing:
+            return
+        self.ids.update(User.objects.filter(
+            username__in=missing
+        ).values_list('username', 'pk'))
+        new_users = [
+            User(username=username, password=make_password(None))
+            for username in missing - set(self.ids)
+        ]
+        if new_users:
+            User.objects.bulk_create(new_users)
+            self.ids.update(User.objects.filter(
+                username__in=[user.username for user in new_users]
+            ).values_list('username', 'pk'))
+
+    def __getitem__(self, username):
+        return self.ids[username]
+
+
+class _Groups:
+    """Map slugs to ids; dumped groups whose slug exists are skipped."""
+
+    def __init__(self):
+        self.ids = {None: None}
+
+    def new(self, rows):
+        """Groups of ``rows`` to insert, without a primary key when their
+        dumped one belongs to another group."""
+        existing = set(Group.objects.filter(
+            slug__in=[row['slug'] for row in rows]
+        ).values_list('slug', flat=True))
+        taken = set(Group.objects.filter(
+            pk__in=[row['pk'] for row in rows]
+        ).values_list('pk', flat=True))
+        groups = []
+        for row in rows:
+            if row['slug'] in existing:
+                continue
+            if row['pk'] in taken:
+                row = dict(row, pk=None)
+            groups.append(Group(**row))
+        return groups
+
+    def resolve(self, slugs):
+        missing = set(slugs) - set(self.ids)
+        if missing:
+            self.ids.update(Group.objects.filter(
+                slug__in=missing
+            ).values_list('slug', 'pk'))
+
+    def __getitem__(self, slug):
+        return self.ids[slug]
+
+
+# Model -> fields telling a row imported before from another row that
+# took its primary key.
+IDENTITY = {
+    Post: ('author_id', 'pub_date'),
+    Comment: ('post_id', 'author_id', 'created'),
+}
+
+
+def bulk_insert(model, objs):
+    """Insert ``objs`` with primary keys and dates as they are.
+
+    ``bulk_create`` stamps ``auto_now_add`` fields with the current
+    time, so the given dates are written back with ``bulk_update``.
+    No signals are sent.
+    """
+    objs = list(objs)
+    dates = [
+        field.attname for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    values = [[getattr(obj, name) for name in dates] for obj in objs]
+    model.objects.bulk_create(objs)
+    if not dates:
+        return
+    for obj, row in zip(objs, values):
+        for name, value in zip(dates, row):
+            setattr(obj, name, value)
+    model.objects.bulk_update(objs, dates)
+
+
+def place(model, objs):
+    """Return ``objs`` to insert and ``{dumped pk: new pk}``.
+
+    Objects whose primary key exists with the same ``IDENTITY`` values
+    were imported before and are left out; those whose key belongs to
+    another row get a new one past every key in use.
+    """
+    fields = IDENTITY[model]
+    existing = {row[0]: row[1:] for row in model.objects.filter(
+        pk__in=[obj.pk for obj in objs]
+    ).values_list('pk', *fields)}
+    new_objs = []
+    remapped = {}
+    next_pk = None
+    for obj in objs:
+        if obj.pk in existing:
+            if existing[obj.pk] == tuple(
+                getattr(obj, name) for name in fields
+            ):
+                continue
+            if next_pk is None:
+                next_pk = max(
+                    model.objects.aggregate(pk=Max('pk'))['pk'] or 0,
+                    *(obj.pk for obj in objs),
+                ) + 1
+            remapped[obj.pk] = next_pk
+            obj.pk = next_pk
+            next_pk += 1
+        new_objs.append(obj)
+    return new_objs, remapped
+
+
+def _build(name, rows, users, groups, posts):
+    users.resolve(
+        row[key] for row in rows for key in row if key.endswith('username')
+    )
+    if name == 'post':
+        groups.resolve(row['group__slug'] for row in rows)
+        return [Post(
+            pk=row['pk'], text=row['text'],
+            pub_date=parse_datetime(row['pub_date']),
+            author_id=users[row['author__username']],
+            group_id=groups[row['group__slug']], image=row['image'] or None,
+        ) for row in rows]
+    if name == 'comment':
+        return [Comment(
+            pk=row['pk'], post_id=posts.get(row['post_id'], row['post_id']),
+            text=row['text'], author_id=users[row['author__username']],
+            created=parse_datetime(row['created']),
+        ) for row in rows]
+    return [Follow(
+        user_id=users[row['user__username']],
+        author_id=users[row['author__username']],
+    ) for row in rows]
+
+
+def _scopes(objs):
+    """Cache scopes whose pages show the imported ``objs``."""
+    scopes = {cache.INDEX}
+    for obj in objs:
+        if isinstance(obj, Group):
+            scopes.add(cache.group_scope(obj.pk))
+        elif isinstance(obj, Post):
+            scopes.add(cache.profile_scope(obj.author_id))
+            scopes.add(cache.group_scope(obj.group_id))
+        elif isinstance(obj, Comment):
+            scopes.add(cache.post_scope(obj.post_id))
+        else:
+            scopes.add(cache.follow_scope(obj.user_id))
+            scopes.add(cache.profile_scope(obj.author_id))
+    return scopes
+
+
+def load(path, batch_size):
+    """Import ``path``; yield ``(model name, rows, seconds)`` per model.
+
+    Every batch is inserted in its own transaction. Rows imported before
+    are skipped, as are groups whose slug and follows whose pair exists;
+    posts whose key another post has taken get a new one, and their
+    comments follow them. Bulk inserts send no signals, so cached pages
+    are invalidated here while timelines, counters and the search index
+    are left to their rebuild commands.
+    """
+    users = _Users()
+    groups = _Groups()
+    # Dumped post id -> new id, for posts whose id was taken.
+    posts = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as dump:
+        lines = (json.loads(line) for line in dump)
+        for name, records in groupby(lines, key=lambda line: line['model']):
+            if name not in MODELS:
+                raise ValueError('Unknown model "%s" in the dump' % name)
+            model = MODELS[name][0]
+            started = time.monotonic()
+            count = 0
+            records = (record['data'] for record in records)
+            while True:
+                rows = list(islice(records, batch_size))
+                if not rows:
+                    break
+                with transaction.atomic():
+                    if name == 'group':
+                        # Some groups may get a new primary key.
+                        objs = groups.new(rows)
+                        Group.objects.bulk_create(objs)
+                    elif name == 'follow':
+                        objs = _build(name, rows, users, groups, posts)
+                        Follow.objects.bulk_create(
+                            objs, ignore_conflicts=True
+                        )
+                    else:
+                        objs, remapped = place(model, _build(
+                            name, rows, users, groups, posts
+                        ))
+                        if name == 'post':
+                            posts.update(remapped)
+                        bulk_insert(model, objs)
+                    cache.bump(*_scopes(objs))
+                count += len(rows)
+            yield name, count, time.monotonic() - started
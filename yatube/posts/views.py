@@ -1,42 +1,103 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import router, transaction
 from django.shortcuts import redirect, render, get_object_or_404
+from django.views.decorators.http import etag
+
+from core.db import pin_primary, read_replica
+
 from .forms import PostForm, CommentForm
 from .models import Post, Group, Follow
+from . import cache, counters, follows, search, thumbnails
+from .feeds import FollowFeed
+from .paginator import InvalidCursor, paginate, paginate_comments
 
 User = get_user_model()
 
 
+def _get_object(request, model, **lookup):
+    """get_object_or_404 shared by a view and its cache validators.
+
+    Objects are kept per database, as a request may switch from a
+    replica to the primary once it sees a recent write.
+    """
+    found = request.__dict__.setdefault('_posts_objects', {})
+    key = (model, router.db_for_read(model), tuple(sorted(lookup.items())))
+    if key not in found:
+        found[key] = get_object_or_404(model, **lookup)
+    return found[key]
+
+
+def _group_scopes(request, slug):
+    group = _get_object(request, Group, slug=slug)
+    return [cache.group_scope(group.pk)]
+
+
+def _index_scopes(request):
+    # Cards of an authenticated user show whom they follow.
+    if request.user.is_authenticated:
+        return [cache.INDEX, cache.follow_scope(request.user.pk)]
+    return [cache.INDEX]
+
+
+def _post_scopes(request, post_id):
+    post = _get_object(request, Post, pk=post_id)
+    return [cache.post_scope(post.pk), cache.profile_scope(post.author_id)]
+
+
+def _profile_scopes(request, username):
+    author = _get_object(request, User, username=username)
+    return [cache.profile_scope(author.pk)]
+
+
+def _versioned(scopes):
+    """Serve a page built from ``scopes`` with an ETag and from the
+    anonymous page cache."""
+    def etag_func(request, *args, **kwargs):
+        return cache.etag(request, *scopes(request, *args, **kwargs))
+
+    def decorator(view):
+        return etag(etag_func)(cache.anonymous_page(scopes)(view))
+    return decorator
+
+
+@read_replica
+@_versioned(_group_scopes)
 def group_posts(request, slug):
     """This view render group posts."""
-    group = get_object_or_404(Group, slug=slug)
-    paginator = Paginator(group.posts.all(), settings.PAGE_PER_PAGE)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    group = _get_object(request, Group, slug=slug)
+    page_obj = paginate(
+        request, group.posts.select_related('author', 'group')
+    )
     context = {
         'page_obj': page_obj,
         'group': group,
+        **cache.fragment_context(cache.group_scope(group.pk)),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@read_replica
+@_versioned(_index_scopes)
 def index(request):
     """This view render main page."""
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, settings.PAGE_PER_PAGE)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
+        **cache.fragment_context(*_index_scopes(request)),
     }
     return render(request, 'posts/index.html', context)
 
 
+@read_replica
+@_versioned(_post_scopes)
 def post_detail(request, post_id):
     """This view render post detail by its id."""
-    post = get_object_or_404(Post, pk=post_id)
-    count_of_posts = post.author.posts.count()
-    comments = post.comments.all()
+    post = _get_object(request, Post, pk=post_id)
+    count_of_posts = counters.for_user(post.author_id).posts_count
+    comments = paginate_comments(request, post)
     form = CommentForm()
     context = {
         'page_obj': post,
@@ -47,27 +108,39 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """This view render the next batch of post comments."""
+    post = get_object_or_404(Post, pk=post_id)
+    context = {
+        'post': post,
+        'comments': paginate_comments(request, post),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@read_replica
+@_versioned(_profile_scopes)
 def profile(request, username):
     """This view render profile page by its username."""
-    author = get_object_or_404(User, username=username)
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(user=request.user, author=author).exists()
-    else:
-        following = False
-    post_list = author.posts.all()
-    count_of_posts = post_list.count()
-    paginator = Paginator(post_list, settings.PAGE_PER_PAGE)
-    page_obj = paginator.get_page(request.GET.get('page'))
+    author = _get_object(request, User, username=username)
+    following = follows.is_following(request.user, author.pk)
+    post_list = author.posts.select_related('author', 'group')
+    author_counters = counters.for_user(author.pk)
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
         'author': author,
-        'count_of_posts': count_of_posts,
+        'count_of_posts': author_counters.posts_count,
+        'author_counters': author_counters,
         'following': following,
+        **cache.fragment_context(cache.profile_scope(author.pk)),
     }
     return render(request, 'posts/profile.html', context)
 
 
 @login_required
+@pin_primary
+@transaction.atomic
 def post_create(request):
     """This view create new post in database."""
     if request.method != 'POST':
@@ -81,10 +154,12 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    thumbnails.schedule(post)
     return redirect('posts:profile', username=post.author.username)
 
 
 @login_required
+@pin_primary
 def post_edit(request, post_id):
     """This view edits the post by its id and saves changes in database."""
     post = get_object_or_404(Post, pk=post_id)
@@ -100,12 +175,16 @@ def post_edit(request, post_id):
         instance=post)
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id=post_id)
     return render(request, 'posts/create_post.html', {'form': form,
                                                       'is_edit': True})
 
 
 @login_required
+@pin_primary
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -117,31 +196,58 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_replica
 @login_required
 def follow_index(request):
     """Напишите view-функцию страницы, куда будут выведены посты авторов,
     на которых подписан текущий пользователь.
     """
-    authors_id = request.user.follower.all().values_list('author', flat=True)
-    posts = Post.objects.filter(author_id__in=authors_id)
-    paginator = Paginator(posts, settings.PAGE_PER_PAGE)
-    page_obj = paginator.get_page(request.GET.get('page'))
-    context = {'page_obj': page_obj}
+    # Versions first: a recent write moves the reads to the primary.
+    fragment_context = cache.fragment_context(
+        cache.INDEX, cache.follow_scope(request.user.pk)
+    )
+    # A numbered page would read offset + limit rows from every source.
+    page_obj = paginate(request, FollowFeed(request.user), cursor=True)
+    context = {
+        'page_obj': page_obj,
+        **fragment_context,
+    }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@pin_primary
+@transaction.atomic
 def profile_follow(request, username):
     user = get_object_or_404(User, username=request.user)
     author = get_object_or_404(User, username=username)
-    Follow.objects.create(user=user, author=author)
+    Follow.objects.get_or_create(user=user, author=author)
     return redirect('posts:follow_index')
 
 
 @login_required
+@pin_primary
+@transaction.atomic
 def profile_unfollow(request, username):
     user = get_object_or_404(User, username=request.user)
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=user, author=author).delete()
     return redirect('posts:follow_index')
 
+
+def post_search(request):
+    """This view render posts matching the search query, best first."""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        try:
+            page_obj = search.search(
+                query, request.GET.get('after'), settings.PAGE_PER_PAGE
+            )
+        except InvalidCursor:
+            page_obj = search.search(query, per_page=settings.PAGE_PER_PAGE)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
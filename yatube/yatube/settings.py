@@ -47,6 +47,8 @@ INSTALLED_APPS = [
     'sorl.thumbnail',
 ]
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,15 +58,35 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
 ]
+if DEBUG:
+    # Right after ServerTimingMiddleware, which must stay first.
+    MIDDLEWARE.insert(1, 'core.middleware.QueryBudgetMiddleware')
+
+# Send per-request timings as Server-Timing headers to every client, not
+# only to staff; they are logged to yatube.timing either way.
+SERVER_TIMING = DEBUG
 
 ROOT_URLCONF = 'yatube.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Templates are reloaded on every request in development only.
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates whose render time is reported by
+        # ServerTimingMiddleware, see core.timing.
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -85,9 +107,42 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Applied to every new SQLite connection (see core.db). WAL lets readers
+# run while a post or comment is written, synchronous=NORMAL is durable
+# across application crashes in WAL mode and only skips an fsync per
+# commit, the rest trades memory for fewer reads.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
+}
+
+# Read replicas of the default database used by read-only views, see
+# core.db. To try it locally point YATUBE_REPLICA_DB at a copy of
+# db.sqlite3; tests read the replica through the default connection.
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['YATUBE_REPLICA_DB'],
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica')
+
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+
+# After a write the user reads from the default database for this long.
+REPLICA_PIN_COOKIE = 'primary'
+REPLICA_PIN_SECONDS = 10
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -128,6 +183,93 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGE_PER_PAGE = 10
 
+# Seek on (pub_date, id) with ?after=/?before= cursors instead of
+# numbered pages: no COUNT(*) and no OFFSET scan on deep pages.
+PAGE_CURSOR_PAGINATION = False
+
+COMMENTS_PER_PAGE = 20
+
+# Read API: largest ?limit= accepted and rows fetched per query when a
+# feed is streamed as NDJSON.
+API_MAX_PAGE_SIZE = 100
+API_STREAM_CHUNK_SIZE = 500
+
+# Follow feed timelines: rows per bulk insert and how many of the latest
+# posts of a newly followed author are copied in (None copies them all).
+TIMELINE_BATCH_SIZE = 1000
+TIMELINE_FOLLOW_BACKFILL = 1000
+
+# Authors with at least this many followers are pulled into follow feeds
+# at read time instead of being fanned out (None fans out everybody).
+FEED_CELEBRITY_THRESHOLD = 10000
+FEED_CELEBRITY_CACHE_TIMEOUT = 300
+
+# Per-request SQL query budget of these read views (None disables the
+# check); exceeding it raises when QUERY_BUDGET_RAISE is set and is
+# logged otherwise. Views that write are not budgeted.
+QUERY_BUDGET = 10
+QUERY_BUDGET_RAISE = False
+QUERY_BUDGET_VIEWS = (
+    'posts.views.index',
+    'posts.views.group_posts',
+    'posts.views.profile',
+    'posts.views.post_detail',
+    'posts.views.post_comments',
+    'posts.views.follow_index',
+    'posts.views.post_search',
+)
+
+# Writes invalidate cached pages by bumping versions in the cache (see
+# posts.cache), which only reaches the other processes through a shared
+# cache. Point YATUBE_MEMCACHED at memcached servers (comma separated,
+# needs python-memcached) to keep pages for hours; the per-process
+# locmem cache keeps them for a minute only.
+if os.environ.get('YATUBE_MEMCACHED'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ['YATUBE_MEMCACHED'].split(','),
+        }
+    }
+    FEED_CACHE_TIMEOUT = 60 * 60 * 6
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    FEED_CACHE_TIMEOUT = 60
+# Whole pages served to anonymous readers, invalidated the same way.
+ANONYMOUS_PAGE_CACHE_TIMEOUT = FEED_CACHE_TIMEOUT
+
+# Threads rendering post thumbnails after uploads (0 renders them in the
+# request, once its transaction commits).
+THUMBNAIL_WORKERS = 2
+# An image whose thumbnails fail to render is retried after this many
+# seconds, twice as long after every further failure, up to the maximum.
+THUMBNAIL_RETRY_DELAY = 60
+THUMBNAIL_RETRY_MAX_DELAY = 24 * 60 * 60
+# Widths of the post image variants offered in srcset; the largest one is
+# the src of the feed card.
+THUMBNAIL_WIDTHS = (480, 960, 1611)
+# Thumbnail records are read in one batch per page (see posts.kvstore),
+# the most recent ones are also kept in process memory for a while, as
+# sweep_images may delete them in another process.
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_KVSTORE_LRU_SIZE = 10000
+THUMBNAIL_KVSTORE_LRU_TIMEOUT = 60
+# sweep_images keeps unused images saved less than this many seconds ago,
+# longer than any transaction saving a post with an existing image.
+IMAGE_SWEEP_GRACE = 24 * 60 * 60
+
+# Aggregate SQL statistics by fingerprint (see core.querylog), log
+# statements slower than SLOW_QUERY_MS and keep at most
+# QUERY_LOG_MAX_ENTRIES fingerprint and view pairs per process. Plans of
+# slow statements are read when the staff report is rendered.
+QUERY_LOG = DEBUG
+SLOW_QUERY_MS = 100
+QUERY_LOG_MAX_ENTRIES = 1000
+
 POST_SYMBOLS = 15
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -135,8 +277,12 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
-}
\ No newline at end of file
+# View benchmarks (manage.py benchmark_views): baseline file and how much
+# slower than the baseline a view may get before the run fails.
+BENCHMARK_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'views.json')
+BENCHMARK_TOLERANCE = 0.5
+# Feed card included per post before post_card, the baseline of
+# manage.py benchmark_cards.
+BENCHMARK_CARD_BASELINE = os.path.join(
+    BASE_DIR, 'benchmarks', 'post_list.html'
+)